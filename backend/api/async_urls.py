@@ -0,0 +1,11 @@
+from django.urls import path
+
+from .async_views import (ingredients_list, recipes_detail, recipes_list,
+                          tags_list)
+
+urlpatterns = [
+    path('tags/', tags_list),
+    path('ingredients/', ingredients_list),
+    path('recipes/', recipes_list),
+    path('recipes/<int:pk>/', recipes_detail),
+]
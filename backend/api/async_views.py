@@ -0,0 +1,59 @@
+"""Асинхронный путь чтения для ASGI.
+
+В Django 3.2 под ASGI все синхронные вьюхи выполняются в одном общем
+потоке, поэтому один долгий запрос задерживает остальные. Здесь чтение
+тегов, ингредиентов и рецептов идёт из асинхронной вьюхи в пуле
+потоков (у каждого потока своё соединение с БД), а запись остаётся
+в общем потоке, как у обычных синхронных вьюх.
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from rest_framework.permissions import SAFE_METHODS
+
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+
+def render(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def read_in_pool(view, request, *args, **kwargs):
+    try:
+        return render(view, request, *args, **kwargs)
+    finally:
+        # request_finished закрывает соединения только в общем потоке
+        close_old_connections()
+
+
+def async_read(view):
+    """Оборачивает DRF-вьюху: безопасные методы идут в пул потоков,
+    остальные - в общий поток."""
+    read = sync_to_async(read_in_pool, thread_sensitive=False)
+    write = sync_to_async(render)
+
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await read(view, request, *args, **kwargs)
+        return await write(view, request, *args, **kwargs)
+    return async_view
+
+
+tags_list = async_read(TagViewSet.as_view({'get': 'list'}))
+ingredients_list = async_read(IngredientViewSet.as_view({'get': 'list'}))
+recipes_list = async_read(RecipeViewSet.as_view({
+    'get': 'list',
+    'post': 'create',
+}))
+recipes_detail = async_read(RecipeViewSet.as_view({
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}))
@@ -0,0 +1,103 @@
+"""Аутентификация по токену без запроса к БД на каждый вызов API.
+
+Токены хранятся в LRU-кэше процесса с ограниченным временем жизни,
+при AUTH_TOKEN_SHARED_CACHE - ещё и в общем кэше Django. Выход,
+смена пароля и блокировка сбрасывают записи сразу в своём процессе и в
+общем кэше; в остальных процессах запись живёт не дольше
+AUTH_TOKEN_CACHE_TTL.
+"""
+
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+SHARED_CACHE_KEY = 'auth_token:{digest}'
+
+
+class TokenCache:
+    """LRU с TTL: {ключ токена: (пользователь, токен, срок)}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[2] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[:2]
+
+    def set(self, key, user, token):
+        expires = time.monotonic() + settings.AUTH_TOKEN_CACHE_TTL
+        with self.lock:
+            self.entries[key] = (user, token, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+def get_shared_key(key):
+    # В общий кэш не кладём сам токен
+    return SHARED_CACHE_KEY.format(
+        digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def invalidate_tokens(keys):
+    keys = list(keys)
+    for key in keys:
+        token_cache.delete(key)
+    if settings.AUTH_TOKEN_SHARED_CACHE and keys:
+        cache.delete_many([get_shared_key(key) for key in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None and settings.AUTH_TOKEN_SHARED_CACHE:
+            cached = cache.get(get_shared_key(key))
+            if cached is not None:
+                token_cache.set(key, *cached)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            if settings.AUTH_TOKEN_SHARED_CACHE:
+                cache.set(
+                    get_shared_key(key),
+                    (user, token),
+                    settings.AUTH_TOKEN_SHARED_CACHE_TTL,
+                )
+            cached = user, token
+        user, token = cached
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(
+                _('User inactive or deleted.'))
+        # Вьюхи могут менять request.user, закэшированный объект
+        # не должен это видеть
+        user = copy.copy(user)
+        token = copy.copy(token)
+        token.user = user
+        return user, token
@@ -0,0 +1,153 @@
+"""Кэширование данных, общих для нескольких запросов"""
+
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import DEFAULT_DB_ALIAS
+from foodgram.routers import get_cache_timeout
+from recipes.models import Tag
+from users.models import Subscriptions
+
+SUBSCRIPTIONS_CACHE_KEY = 'subscriptions:{user_id}'
+SUBSCRIPTIONS_CACHE_TIMEOUT = 60 * 15
+TAG_IDS_CACHE_KEY = 'tag_ids'
+# Сброс по сигналу виден только в своём процессе при LocMemCache,
+# остальные воркеры увидят новый тег не позже чем через этот срок
+TAG_IDS_CACHE_TIMEOUT = 60
+FEED_GENERATION_KEY = 'recipe_feed:generation'
+FEED_CACHE_KEY = 'recipe_feed:{generation}:{digest}'
+RECIPE_FRAGMENT_KEY = 'recipe_fragment:{recipe_id}'
+
+
+def is_local_cache():
+    """Кэш у каждого процесса свой, и сброс виден только в нём."""
+    return isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache)
+
+
+def get_local_timeout(timeout):
+    """Срок для записи, которую сбрасывают сигналы.
+
+    С кэшем в памяти процесса остальные воркеры узнают об изменении
+    только по истечении записи, поэтому она живёт не дольше
+    LOCAL_CACHE_TIMEOUT.
+    """
+    if not is_local_cache():
+        return timeout
+    if timeout is None:
+        return settings.LOCAL_CACHE_TIMEOUT
+    return min(timeout, settings.LOCAL_CACHE_TIMEOUT)
+
+
+def get_subscribed_author_ids(user):
+    """Возвращает множество id авторов, на которых подписан пользователь."""
+    key = SUBSCRIPTIONS_CACHE_KEY.format(user_id=user.id)
+    author_ids = cache.get(key)
+    if author_ids is None:
+        # Кэш сбрасывается после записи в основную базу, и заполнять
+        # его с отстающей реплики нельзя
+        author_ids = frozenset(
+            Subscriptions.objects.using(DEFAULT_DB_ALIAS).filter(
+                user=user
+            ).values_list('author__id', flat=True)
+        )
+        cache.set(
+            key, author_ids, get_local_timeout(SUBSCRIPTIONS_CACHE_TIMEOUT))
+    return author_ids
+
+
+def invalidate_subscriptions(user_id):
+    cache.delete(SUBSCRIPTIONS_CACHE_KEY.format(user_id=user_id))
+
+
+def get_tag_ids():
+    """Возвращает словарь {слаг тега: id}."""
+    tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+    if tag_ids is None:
+        tag_ids = dict(Tag.objects.using(
+            DEFAULT_DB_ALIAS).values_list('slug', 'id'))
+        cache.set(TAG_IDS_CACHE_KEY, tag_ids, TAG_IDS_CACHE_TIMEOUT)
+    return tag_ids
+
+
+def invalidate_tag_ids():
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+def get_feed_generation():
+    """Текущее поколение кэша ленты рецептов.
+
+    Начальное значение берётся из времени, чтобы после вытеснения ключа
+    не вернуться к поколению, ответы которого ещё лежат в кэше.
+    """
+    generation = cache.get(FEED_GENERATION_KEY)
+    if generation is None:
+        cache.add(FEED_GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(FEED_GENERATION_KEY)
+    return generation
+
+
+def invalidate_recipe_feed():
+    """Переводит ленту на новое поколение, старые ответы просто
+    перестают читаться и истекают сами."""
+    try:
+        cache.incr(FEED_GENERATION_KEY)
+    except ValueError:
+        cache.set(FEED_GENERATION_KEY, time.time_ns(), None)
+
+
+def get_feed_cache_key(request):
+    """Ключ ответа по хосту, пути и параметрам запроса без учёта их
+    порядка: ссылки пагинации и картинок в ответе абсолютные."""
+    query = urlencode(sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    ))
+    url = f'{request.get_host()}{request.path}?{query}'
+    return FEED_CACHE_KEY.format(
+        generation=get_feed_generation(),
+        digest=hashlib.md5(url.encode()).hexdigest(),
+    )
+
+
+def get_cached_feed(key):
+    return cache.get(key)
+
+
+def set_cached_feed(key, data):
+    cache.set(key, data, get_cache_timeout(
+        get_local_timeout(settings.RECIPE_FEED_CACHE_TIMEOUT)))
+
+
+def get_recipe_fragments(recipe_ids):
+    """Возвращает {id рецепта: фрагмент} для найденных в кэше."""
+    keys = {
+        RECIPE_FRAGMENT_KEY.format(recipe_id=recipe_id): recipe_id
+        for recipe_id in recipe_ids
+    }
+    return {
+        keys[key]: fragment
+        for key, fragment in cache.get_many(keys).items()
+    }
+
+
+def set_recipe_fragments(fragments):
+    cache.set_many(
+        {
+            RECIPE_FRAGMENT_KEY.format(recipe_id=recipe_id): fragment
+            for recipe_id, fragment in fragments.items()
+        },
+        get_cache_timeout(
+            get_local_timeout(settings.RECIPE_FRAGMENT_CACHE_TIMEOUT)),
+    )
+
+
+def invalidate_recipe_fragments(recipe_ids):
+    cache.delete_many([
+        RECIPE_FRAGMENT_KEY.format(recipe_id=recipe_id)
+        for recipe_id in recipe_ids
+    ])
@@ -1,25 +1,130 @@
 """Дополнительные поля"""
 
 import base64
+import binascii
 
 import webcolors
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.uploadedfile import TemporaryUploadedFile
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+
+BASE64_CHUNK_SIZE = 64 * 1024
+
+
+def iter_base64_chunks(data, size=BASE64_CHUNK_SIZE):
+    """Куски base64 без переводов строк и пробелов (RFC 2045) длиной,
+    кратной 4, чтобы каждый декодировался отдельно."""
+    tail = ''
+    for start in range(0, len(data), size):
+        chunk = tail + ''.join(data[start:start + size].split())
+        end = len(chunk) - len(chunk) % 4
+        tail = chunk[end:]
+        if end:
+            yield chunk[:end]
+    if tail:
+        yield tail
 
 
 class Base64ImageField(serializers.ImageField):
+    """Декодирует base64 частями во временный файл на диске,
+    не держа в памяти вторую копию изображения."""
+    default_error_messages = {
+        'too_large': 'Изображение больше {max_size} байт.',
+        'invalid_base64': 'Изображение повреждено.',
+    }
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
-
+            data = self.decode(data)
         return super().to_internal_value(data)
 
+    def decode(self, data):
+        try:
+            format, imgstr = data.split(';base64,')
+        except ValueError:
+            self.fail('invalid_base64')
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if len(imgstr) * 3 // 4 > max_size:
+            self.fail('too_large', max_size=max_size)
+        ext = format.split('/')[-1]
+        file = TemporaryUploadedFile(
+            'temp.' + ext, f'image/{ext}', 0, None)
+        try:
+            for chunk in iter_base64_chunks(imgstr):
+                file.write(base64.b64decode(chunk, validate=True))
+        except binascii.Error:
+            file.close()
+            self.fail('invalid_base64')
+        file.size = file.tell()
+        file.seek(0)
+        return file
+
     def to_representation(self, file):
         return '/media/' + super().to_representation(file)
 
 
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии иллюстрации; пока копии
+    не готовы, вместо них отдаётся оригинал."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        variants = recipe.image_variants or {}
+        original = settings.MEDIA_URL + recipe.image.name
+        return {
+            'thumbnail': self.get_url(variants.get('thumbnail'), original),
+            'card': self.get_url(variants.get('card'), original),
+            'placeholder': variants.get('placeholder'),
+        }
+
+    def get_url(self, name, original):
+        if name is None:
+            return original
+        return settings.MEDIA_URL + name
+
+
+def get_objects_by_pks(queryset, pks):
+    """Достаёт объекты одним запросом id__in в порядке pks.
+
+    Если каких-то объектов нет, сообщает сразу обо всех.
+    """
+    try:
+        pks = [int(pk) for pk in pks]
+    except (TypeError, ValueError):
+        raise serializers.ValidationError(
+            'Некорректный тип. Ожидались целые числа.')
+    objects = queryset.in_bulk(set(pks))
+    missing = sorted(set(pks) - objects.keys())
+    if missing:
+        raise serializers.ValidationError(
+            f'Объекты с id {", ".join(map(str, missing))} не существуют.')
+    return [objects[pk] for pk in pks]
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        return get_objects_by_pks(self.child_relation.get_queryset(), data)
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """При many=True проверяет весь список одним запросом."""
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
 class Hex2NameColor(serializers.Field):
     def to_representation(self, value):
         return value
@@ -1,11 +1,22 @@
 import django_filters
 import django_filters.rest_framework as filters
-from django.db.models import Q
-from recipes.models import Ingredient, Recipe
+from django.db.models import Exists, OuterRef, Q
+from recipes.models import BuyLists, Favourites, Ingredient, Recipe
+
+from .cache import get_tag_ids
+
+
+def get_tag_choices():
+    return [(slug, slug) for slug in get_tag_ids()]
 
 
 class RecipeFilter(filters.FilterSet):
-    tags = filters.AllValuesMultipleFilter(field_name='tags__slug')
+    """Все условия накладываются через EXISTS, поэтому рецепт
+    не дублируется и DISTINCT не нужен."""
+    tags = filters.MultipleChoiceFilter(
+        choices=get_tag_choices,
+        method='filter_tags'
+    )
     author = filters.NumberFilter(field_name='author__id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
@@ -15,15 +26,32 @@ class RecipeFilter(filters.FilterSet):
         model = Recipe
         fields = ['tags', 'author']
 
+    def filter_tags(self, queryset, name, value):
+        if not value:
+            return queryset
+        tag_ids = get_tag_ids()
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'),
+            tag__id__in=[tag_ids[slug] for slug in value]
+        )))
+
+    def filter_user_recipes(self, queryset, model):
+        user = self.request.user
+        if user.is_anonymous:
+            return queryset.none()
+        return queryset.filter(Exists(model.objects.filter(
+            user=user,
+            recipe=OuterRef('pk')
+        )))
+
     def filter_is_favorited(self, queryset, name, value):
         if value:
-            return queryset.filter(in_favourites__user=self.request.user)
+            return self.filter_user_recipes(queryset, Favourites)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return queryset.filter(
-                in_buylist__user=self.request.user)
+            return self.filter_user_recipes(queryset, BuyLists)
         return queryset
 
 
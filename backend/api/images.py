@@ -0,0 +1,108 @@
+"""Уменьшенные копии иллюстраций рецептов"""
+
+import base64
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+from recipes.models import Recipe
+
+from .cache import invalidate_recipe_feed, invalidate_recipe_fragments
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipe_images/variants'
+VARIANT_SIZES = {
+    'thumbnail': (240, 240),
+    'card': (600, 600),
+}
+PLACEHOLDER_SIZE = (16, 16)
+WEBP_QUALITY = 80
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def encode_webp(image, size):
+    copy = image.copy()
+    copy.thumbnail(size)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'WEBP', quality=WEBP_QUALITY)
+    return buffer.getvalue()
+
+
+def make_variants(image_name):
+    """Сохраняет копии иллюстрации в WebP и возвращает
+    их пути и крошечную заглушку в виде data URI."""
+    with default_storage.open(image_name) as file:
+        image = Image.open(file)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    variants = {}
+    for name, size in VARIANT_SIZES.items():
+        variants[name] = default_storage.save(
+            f'{VARIANTS_DIR}/{name}.webp',
+            ContentFile(encode_webp(image, size))
+        )
+    placeholder = base64.b64encode(encode_webp(image, PLACEHOLDER_SIZE))
+    variants['placeholder'] = (
+        'data:image/webp;base64,' + placeholder.decode()
+    )
+    return variants
+
+
+def build_image_variants(recipe_id, image_name):
+    """Записывает копии в рецепт, если иллюстрацию
+    за это время не заменили."""
+    try:
+        variants = make_variants(image_name)
+        updated = Recipe.objects.filter(
+            id=recipe_id, image=image_name
+        ).update(image_variants=variants)
+        if updated:
+            # update() не шлёт сигналов, кэши сбрасываем сами
+            invalidate_recipe_fragments([recipe_id])
+            invalidate_recipe_feed()
+    except Exception:
+        logger.exception('Не удалось обработать %s', image_name)
+
+
+def build_in_background(recipe_id, image_name):
+    try:
+        build_image_variants(recipe_id, image_name)
+    finally:
+        connections.close_all()
+
+
+def schedule_image_variants(recipe):
+    """После коммита отправляет обработку иллюстрации в фоновый пул.
+
+    При IMAGE_WORKERS = 0 копии строятся сразу в текущем потоке.
+    """
+    recipe_id, image_name = recipe.id, recipe.image.name
+
+    def submit():
+        if settings.IMAGE_WORKERS:
+            get_executor().submit(build_in_background, recipe_id, image_name)
+        else:
+            build_image_variants(recipe_id, image_name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,286 @@
+import base64
+import io
+import json
+import math
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from urllib.parse import urlencode
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from recipes.models import BuyLists, Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+
+from .generate_data import PASSWORD
+
+User = get_user_model()
+
+PERCENTILES = (50, 95, 99)
+
+Scenario = namedtuple(
+    'Scenario', ('name', 'method', 'path', 'data', 'accept', 'auth'),
+    defaults=(None, None, True),
+)
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(rank / 100 * len(ordered)) - 1, 0)]
+
+
+@contextmanager
+def temporary_metrics():
+    """Метрики замеров во временном каталоге, а не в общем
+    с запущенным сервером."""
+    with tempfile.TemporaryDirectory() as metrics_dir:
+        with override_settings(METRICS_DIR=metrics_dir):
+            yield
+
+
+def get_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#E26C2D').save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()).decode()
+
+
+class Command(BaseCommand):
+    help = ('Прогоняет маршруты api/urls.py через тестовый клиент и '
+            'выводит JSON с p50/p95/p99 задержки, числом запросов к БД '
+            'и размером ответа. Пишущие сценарии идут парами и '
+            'возвращают данные в исходное состояние. Ограничения частоты '
+            'и числа одновременных запросов на время замера отключены.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--username',
+            help='Пользователь, от имени которого идут запросы. '
+                 'По умолчанию - первый с непустой корзиной',
+        )
+        parser.add_argument(
+            '--only',
+            nargs='+',
+            help='Запустить только сценарии с этими именами',
+        )
+        parser.add_argument(
+            '--read-only',
+            action='store_true',
+            help='Пропустить сценарии, которые меняют данные',
+        )
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def get_user(self, username):
+        users = User.objects.all()
+        if username:
+            users = users.filter(username=username)
+        else:
+            users = users.filter(
+                id__in=BuyLists.objects.values('user')).order_by('id')
+        user = users.first()
+        if user is None:
+            raise CommandError(
+                'Нет подходящего пользователя: выполните generate_data '
+                'или укажите --username')
+        return user
+
+    def get_scenarios(self, user):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        tag = Tag.objects.order_by('id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        author = User.objects.exclude(id=user.id).exclude(
+            subscribe__user=user).order_by('id').first()
+        if recipe is None or tag is None or ingredient is None:
+            raise CommandError('В базе нет рецептов, тегов или ингредиентов')
+        recipe_data = {
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 10,
+            'image': get_image(),
+            'tags': [tag.id],
+            'ingredients': [{'id': ingredient.id, 'amount': 100}],
+        }
+        scenarios = [
+            Scenario('tags-list', 'get', '/api/tags/'),
+            Scenario('tags-detail', 'get', f'/api/tags/{tag.id}/'),
+            Scenario('ingredients-list', 'get', '/api/ingredients/'),
+            Scenario(
+                'ingredients-search', 'get',
+                '/api/ingredients/?' + urlencode(
+                    {'name': ingredient.name[:3]})),
+            Scenario(
+                'ingredients-detail', 'get',
+                f'/api/ingredients/{ingredient.id}/'),
+            Scenario('recipes-list-anon', 'get', '/api/recipes/', auth=False),
+            Scenario('recipes-list', 'get', '/api/recipes/'),
+            Scenario('recipes-list-cursor', 'get', '/api/recipes/?cursor='),
+            Scenario(
+                'recipes-list-tags', 'get', f'/api/recipes/?tags={tag.slug}'),
+            Scenario(
+                'recipes-list-favorited', 'get',
+                '/api/recipes/?is_favorited=1'),
+            Scenario(
+                'recipes-list-in-cart', 'get',
+                '/api/recipes/?is_in_shopping_cart=1'),
+            Scenario('recipes-detail', 'get', f'/api/recipes/{recipe.id}/'),
+            Scenario('users-list', 'get', '/api/users/'),
+            Scenario('users-me', 'get', '/api/users/me/'),
+            Scenario('users-detail', 'get', f'/api/users/{recipe.author_id}/'),
+            Scenario(
+                'users-subscriptions', 'get', '/api/users/subscriptions/'),
+            Scenario(
+                'users-subscriptions-limit', 'get',
+                '/api/users/subscriptions/?recipes_limit=3'),
+        ]
+        scenarios.extend(
+            Scenario(
+                f'download-shopping-cart-{renderer}', 'get',
+                '/api/recipes/download_shopping_cart/', accept=media_type)
+            for renderer, media_type in (
+                ('pdf', 'application/pdf'),
+                ('txt', 'text/plain'),
+                ('csv', 'text/csv'),
+                ('json', 'application/json'),
+            )
+        )
+        writes = [
+            Scenario(
+                'recipes-favorite-add', 'post',
+                f'/api/recipes/{recipe.id}/favorite/'),
+            Scenario(
+                'recipes-favorite-delete', 'delete',
+                f'/api/recipes/{recipe.id}/favorite/'),
+            Scenario(
+                'recipes-shopping-cart-add', 'post',
+                f'/api/recipes/{recipe.id}/shopping_cart/'),
+            Scenario(
+                'recipes-shopping-cart-delete', 'delete',
+                f'/api/recipes/{recipe.id}/shopping_cart/'),
+            Scenario('recipes-create', 'post', '/api/recipes/', recipe_data),
+            Scenario(
+                'recipes-update', 'patch',
+                lambda state: f'/api/recipes/{state["recipe_id"]}/',
+                {**recipe_data, 'cooking_time': 20}),
+            Scenario(
+                'recipes-delete', 'delete',
+                lambda state: f'/api/recipes/{state["recipe_id"]}/'),
+        ]
+        if author is not None:
+            writes.extend((
+                Scenario(
+                    'users-subscribe', 'post',
+                    f'/api/users/{author.id}/subscribe/'),
+                Scenario(
+                    'users-unsubscribe', 'delete',
+                    f'/api/users/{author.id}/subscribe/'),
+            ))
+        # Выход удаляет токен пользователя, поэтому вход и выход - последние
+        if user.check_password(PASSWORD):
+            writes.extend((
+                Scenario(
+                    'auth-token-login', 'post', '/api/auth/token/login/',
+                    {'email': user.email, 'password': PASSWORD}, auth=False),
+                Scenario(
+                    'auth-token-logout', 'post', '/api/auth/token/logout/',
+                    auth=lambda state: state['login_token']),
+            ))
+        return scenarios, writes
+
+    def request(self, client, scenario, state, token):
+        path = scenario.path
+        if callable(path):
+            path = path(state)
+        headers = {}
+        if scenario.accept:
+            headers['HTTP_ACCEPT'] = scenario.accept
+        if callable(scenario.auth):
+            headers['HTTP_AUTHORIZATION'] = f'Token {scenario.auth(state)}'
+        elif scenario.auth:
+            headers['HTTP_AUTHORIZATION'] = f'Token {token}'
+        kwargs = {}
+        if scenario.data is not None:
+            kwargs = {
+                'data': json.dumps(scenario.data),
+                'content_type': 'application/json',
+            }
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(client, scenario.method)(
+                path, **kwargs, **headers)
+            if response.streaming:
+                size = sum(len(chunk) for chunk in response.streaming_content)
+            else:
+                size = len(response.content)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise CommandError(
+                f'{scenario.name}: {response.status_code} '
+                f'{response.content[:200]!r}')
+        if scenario.name == 'recipes-create':
+            state['recipe_id'] = response.json()['id']
+        elif scenario.name == 'auth-token-login':
+            state['login_token'] = response.json()['auth_token']
+        return elapsed, len(queries), size, response.status_code
+
+    def run_scenarios(self, scenarios, user, options):
+        client = Client()
+        state = {}
+        samples = {scenario.name: [] for scenario in scenarios}
+        for iteration in range(options['warmup'] + options['iterations']):
+            # Выход по токену удаляет его, поэтому берём заново
+            token, _ = Token.objects.get_or_create(user=user)
+            for scenario in scenarios:
+                sample = self.request(client, scenario, state, token.key)
+                if iteration >= options['warmup']:
+                    samples[scenario.name].append(sample)
+        return samples
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['username'])
+        scenarios, writes = self.get_scenarios(user)
+        if not options['read_only']:
+            scenarios.extend(writes)
+        if options['only']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario.name in options['only']
+            ]
+        # Иначе каждый сценарий упрётся в лимиты одного пользователя
+        with temporary_metrics(), override_settings(
+                THROTTLE_RATES={}, CONCURRENCY_LIMITS={}):
+            samples = self.run_scenarios(scenarios, user, options)
+
+        results = []
+        for scenario in scenarios:
+            runs = samples[scenario.name]
+            timings = [run[0] * 1000 for run in runs]
+            result = {
+                'name': scenario.name,
+                'method': scenario.method.upper(),
+                'status': runs[-1][3],
+                'queries': max(run[1] for run in runs),
+                'bytes': runs[-1][2],
+            }
+            result.update(
+                (f'p{rank}_ms', round(percentile(timings, rank), 3))
+                for rank in PERCENTILES
+            )
+            results.append(result)
+        report = json.dumps({
+            'user': user.username,
+            'iterations': options['iterations'],
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,65 @@
+import json
+import time
+
+from api.authentication import CachedTokenAuthentication, token_cache
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.request import Request
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает затраты на аутентификацию одного запроса: '
+            'TokenAuthentication из DRF и CachedTokenAuthentication '
+            'с кэшем процесса и с общим кэшем.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def measure(self, authentication, key, iterations):
+        factory = RequestFactory()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for _ in range(iterations):
+                request = Request(
+                    factory.get('/api/recipes/'),
+                    authenticators=[authentication],
+                )
+                request.META['HTTP_AUTHORIZATION'] = f'Token {key}'
+                if request.user.is_anonymous:
+                    raise CommandError('Токен не принят')
+            elapsed = time.perf_counter() - started
+        return {
+            'us_per_request': round(elapsed / iterations * 1e6, 2),
+            'queries_per_request': round(len(queries) / iterations, 3),
+        }
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_active=True).order_by('id').first()
+        if user is None:
+            raise CommandError('Нет ни одного активного пользователя')
+        token, _ = Token.objects.get_or_create(user=user)
+        iterations = options['iterations']
+        report = {
+            'TokenAuthentication': self.measure(
+                TokenAuthentication(), token.key, iterations),
+        }
+        for shared in (False, True):
+            token_cache.clear()
+            with override_settings(AUTH_TOKEN_SHARED_CACHE=shared):
+                name = 'CachedTokenAuthentication' + (
+                    '+shared' if shared else '')
+                report[name] = self.measure(
+                    CachedTokenAuthentication(), token.key, iterations)
+        # Промах в кэше процесса при попадании в общий кэш
+        with override_settings(
+                AUTH_TOKEN_SHARED_CACHE=True, AUTH_TOKEN_CACHE_SIZE=0):
+            report['CachedTokenAuthentication shared only'] = self.measure(
+                CachedTokenAuthentication(), token.key, iterations)
+        self.stdout.write(json.dumps(report, indent=2))
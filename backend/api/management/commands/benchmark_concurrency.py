@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from itertools import cycle, islice
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client
+from recipes.models import Ingredient, Recipe
+from rest_framework.authtoken.models import Token
+from users.models import MyUser
+
+from .benchmark_api import PERCENTILES, percentile, temporary_metrics
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает пропускную способность эндпоинтов чтения под WSGI '
+            '(синхронные вьюхи, --wsgi-workers процессов gunicorn) и под '
+            'ASGI с асинхронными вьюхами при --clients одновременных '
+            'клиентах. Каждый режим запускается в отдельном процессе.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mode', choices=('both', 'wsgi', 'asgi'), default='both')
+        parser.add_argument('--clients', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument(
+            '--wsgi-workers',
+            type=int,
+            default=1,
+            help='Сколько синхронных воркеров gunicorn моделировать',
+        )
+        parser.add_argument(
+            '--username',
+            help='Запросы с токеном этого пользователя, иначе анонимно',
+        )
+
+    def get_paths(self):
+        recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+        ingredient = Ingredient.objects.order_by('id').first()
+        if recipe is None or ingredient is None:
+            raise CommandError('В базе нет рецептов или ингредиентов')
+        return (
+            '/api/tags/',
+            '/api/ingredients/?' + urlencode({'name': ingredient.name[:3]}),
+            '/api/recipes/',
+            f'/api/recipes/{recipe.id}/',
+        )
+
+    def get_authorization(self, username):
+        if not username:
+            return None
+        user = MyUser.objects.filter(username=username).first()
+        if user is None:
+            raise CommandError(f'Нет пользователя {username}')
+        token, _ = Token.objects.get_or_create(user=user)
+        return f'Token {token.key}'
+
+    def run_wsgi(self, paths, authorization, options):
+        headers = {}
+        if authorization:
+            headers['HTTP_AUTHORIZATION'] = authorization
+        requests = iter(islice(cycle(paths), options['requests']))
+        lock = threading.Lock()
+        workers = threading.Semaphore(options['wsgi_workers'])
+        timings, errors = [], []
+
+        def client_loop():
+            client = Client()
+            while True:
+                with lock:
+                    path = next(requests, None)
+                if path is None:
+                    break
+                started = time.perf_counter()
+                with workers:
+                    response = client.get(path, **headers)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(path)
+            connections.close_all()
+
+        threads = [
+            threading.Thread(target=client_loop)
+            for _ in range(options['clients'])
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return timings, errors
+
+    def run_asgi(self, paths, authorization, options):
+        if not settings.ASYNC_READS:
+            raise CommandError('Для режима asgi нужна ASYNC_READS=1')
+        # AsyncClient в Django 3.2 передаёт дополнительные аргументы
+        # как заголовки без префикса HTTP_
+        headers = {}
+        if authorization:
+            headers['authorization'] = authorization
+        requests = iter(islice(cycle(paths), options['requests']))
+        timings, errors = [], []
+
+        async def client_loop():
+            client = AsyncClient()
+            for path in requests:
+                started = time.perf_counter()
+                response = await client.get(path, **headers)
+                timings.append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    errors.append(path)
+
+        async def run():
+            await asyncio.gather(*(
+                client_loop() for _ in range(options['clients'])
+            ))
+
+        asyncio.run(run())
+        return timings, errors
+
+    def run_mode(self, mode, options):
+        paths = self.get_paths()
+        authorization = self.get_authorization(options['username'])
+        run = self.run_wsgi if mode == 'wsgi' else self.run_asgi
+        with temporary_metrics():
+            started = time.perf_counter()
+            timings, errors = run(paths, authorization, options)
+            elapsed = time.perf_counter() - started
+        timings = [timing * 1000 for timing in timings]
+        result = {
+            'requests': len(timings),
+            'errors': len(errors),
+            'clients': options['clients'],
+            'seconds': round(elapsed, 3),
+            'rps': round(len(timings) / elapsed, 1),
+        }
+        result.update(
+            (f'p{rank}_ms', round(percentile(timings, rank), 3))
+            for rank in PERCENTILES
+        )
+        return result
+
+    def spawn(self, mode, options):
+        """Режим задаётся при импорте urls, поэтому каждый - в своём
+        процессе."""
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'),
+            'benchmark_concurrency',
+            '--mode', mode,
+            '--clients', str(options['clients']),
+            '--requests', str(options['requests']),
+            '--wsgi-workers', str(options['wsgi_workers']),
+        ]
+        if options['username']:
+            command += ['--username', options['username']]
+        env = {**os.environ, 'ASYNC_READS': '1' if mode == 'asgi' else ''}
+        output = subprocess.run(
+            command, env=env, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout)[mode]
+
+    def handle(self, *args, **options):
+        if options['mode'] == 'both':
+            report = {
+                mode: self.spawn(mode, options) for mode in ('wsgi', 'asgi')
+            }
+        else:
+            report = {options['mode']: self.run_mode(options['mode'], options)}
+        self.stdout.write(json.dumps(report, indent=2))
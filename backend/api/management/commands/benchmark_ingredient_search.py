@@ -0,0 +1,89 @@
+import json
+import random
+import time
+
+from api.search import IngredientIndex, search_ingredients
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient
+
+from .benchmark_api import PERCENTILES, percentile
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск ингредиентов по индексу в памяти с прежним '
+            'запросом name__istartswith к базе. Запросы - префиксы '
+            'случайных названий, как при наборе в автодополнении.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--names', type=int, default=50,
+            help='Сколько названий набирать',
+        )
+        parser.add_argument(
+            '--max-length', type=int, default=6,
+            help='До скольки символов набирать каждое название',
+        )
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def get_queries(self, options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_ingredients')
+        names = random.Random(options['seed']).sample(
+            names, min(options['names'], len(names)))
+        return [
+            name[:length]
+            for name in names
+            for length in range(1, min(options['max_length'], len(name)) + 1)
+        ]
+
+    def measure(self, search, queries, iterations):
+        timings, found = [], 0
+        with CaptureQueriesContext(connection) as executed:
+            for _ in range(iterations):
+                for query in queries:
+                    started = time.perf_counter()
+                    found += len(search(query))
+                    timings.append((time.perf_counter() - started) * 1000)
+        result = {
+            'searches': len(timings),
+            'db_queries': len(executed),
+            'avg_results': round(found / len(timings), 1),
+        }
+        result.update(
+            (f'p{rank}_ms', round(percentile(timings, rank), 3))
+            for rank in PERCENTILES
+        )
+        return result
+
+    def handle(self, *args, **options):
+        queries = self.get_queries(options)
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+        started = time.perf_counter()
+        IngredientIndex(Ingredient.objects.using(DEFAULT_DB_ALIAS))
+        build_ms = (time.perf_counter() - started) * 1000
+        # Первый вызов строит общий индекс процесса
+        search_ingredients(queries[0])
+        methods = {
+            'index': search_ingredients,
+            'orm': lambda query: list(
+                Ingredient.objects.filter(name__istartswith=query)),
+            'orm-limited': lambda query: list(
+                Ingredient.objects.filter(name__istartswith=query)[:limit]),
+        }
+        report = {
+            'ingredients': Ingredient.objects.count(),
+            'queries': len(queries),
+            'limit': limit,
+            'index_build_ms': round(build_ms, 3),
+            'results': {
+                name: self.measure(search, queries, options['iterations'])
+                for name, search in methods.items()
+            },
+        }
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,154 @@
+import json
+import random
+import time
+
+from api.cache import invalidate_tag_ids
+from api.filters import RecipeFilter
+from api.pagination import KeysetPagination
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Favourites, Recipe, Tag
+
+from .benchmark_api import PERCENTILES, percentile
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Замеряет RecipeFilter при большом числе тегов и больших '
+            'списках избранного: первую страницу и COUNT(*) по фильтрам '
+            'tags, is_favorited и их сочетанию. Теги, метки рецептов и '
+            'пользователь с избранным создаются во временной транзакции '
+            'и откатываются после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--tags', type=int, default=200,
+            help='Сколько тегов добавить к существующим',
+        )
+        parser.add_argument(
+            '--tags-per-recipe', type=int, default=3,
+            help='Сколько новых тегов получает каждый рецепт',
+        )
+        parser.add_argument(
+            '--favourites', type=int, nargs='+', default=[10, 100, 1000],
+            help='Размеры избранного пользователя',
+        )
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def add_tags(self, recipe_ids, options, rng):
+        colors = set(Tag.objects.values_list('color', flat=True))
+        tags = []
+        for number in range(options['tags']):
+            color = f'#{number:06X}'
+            while color in colors:
+                color = f'#{rng.randrange(16 ** 6):06X}'
+            colors.add(color)
+            tags.append(Tag(
+                name=f'Тег замера {number}',
+                slug=f'benchmark-tag-{number}',
+                color=color,
+            ))
+        Tag.objects.bulk_create(tags)
+        tag_ids = list(Tag.objects.filter(
+            slug__startswith='benchmark-tag-').values_list('id', flat=True))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(
+                tag_ids, min(options['tags_per_recipe'], len(tag_ids)))
+        )
+        invalidate_tag_ids()
+        return list(Tag.objects.filter(
+            slug__startswith='benchmark-tag-').values_list('slug', flat=True))
+
+    def measure(self, params, request, iterations):
+        page_timings, count_timings = [], []
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                queryset = RecipeFilter(
+                    params, queryset=Recipe.objects.all(), request=request
+                ).qs
+                page = list(queryset.order_by('-pub_date', '-id')[
+                    :KeysetPagination.page_size])
+                page_timings.append((time.perf_counter() - started) * 1000)
+                started = time.perf_counter()
+                count = queryset.count()
+                count_timings.append((time.perf_counter() - started) * 1000)
+        result = {
+            'matches': count,
+            'page': len(page),
+            'queries': len(queries),
+        }
+        for name, timings in (
+            ('page', page_timings), ('count', count_timings)
+        ):
+            result.update(
+                (f'{name}_p{rank}_ms', round(percentile(timings, rank), 3))
+                for rank in PERCENTILES
+            )
+        return result
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        sizes = sorted(options['favourites'])
+        if len(recipe_ids) < sizes[-1]:
+            raise CommandError(
+                f'В базе {len(recipe_ids)} рецептов, нужно {sizes[-1]}: '
+                'выполните generate_data')
+        slugs = self.add_tags(recipe_ids, options, rng)
+        user = User.objects.create_user(
+            username='benchmark_recipe_filter',
+            email='benchmark_recipe_filter@example.com',
+            first_name='Benchmark',
+            last_name='Recipe filter',
+        )
+        request = RequestFactory().get('/api/recipes/')
+        request.user = user
+        iterations = options['iterations']
+        tag_params = {
+            'tags-1': {'tags': slugs[:1]},
+            'tags-5': {'tags': slugs[:5]},
+            'tags-50': {'tags': slugs[:50]},
+        }
+        results = [
+            {'name': name, **self.measure(params, request, iterations)}
+            for name, params in tag_params.items()
+        ]
+        favourites = rng.sample(recipe_ids, sizes[-1])
+        added = 0
+        for size in sizes:
+            Favourites.objects.bulk_create(
+                Favourites(user=user, recipe_id=recipe_id)
+                for recipe_id in favourites[added:size]
+            )
+            added = size
+            for name, params in (
+                ('is_favorited', {'is_favorited': '1'}),
+                ('is_favorited-tags-5',
+                 {'is_favorited': '1', 'tags': slugs[:5]}),
+            ):
+                results.append({
+                    'name': name,
+                    'favourites': size,
+                    **self.measure(params, request, iterations),
+                })
+        return {
+            'recipes': len(recipe_ids),
+            'tags': Tag.objects.count(),
+            'iterations': iterations,
+            'results': results,
+        }
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            report = self.run(options)
+            transaction.set_rollback(True)
+        invalidate_tag_ids()
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
@@ -0,0 +1,139 @@
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from api.shopping_list import rebuild_shopping_lists
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import Client, override_settings
+from recipes.models import BuyLists, Recipe
+from rest_framework.authtoken.models import Token
+
+from .benchmark_api import PERCENTILES, percentile, temporary_metrics
+
+User = get_user_model()
+
+FORMATS = ('pdf', 'txt', 'csv', 'json')
+
+
+class Command(BaseCommand):
+    help = ('Замеряет выгрузку списка покупок для корзин разного размера: '
+            'p50/p95/p99 задержки с чтением всего ответа и прирост '
+            'пикового RSS процесса. Каждая пара размер/формат идёт в '
+            'отдельном процессе, корзина временного пользователя '
+            'откатывается после замера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10, 100, 1000],
+            help='Число рецептов в корзине',
+        )
+        parser.add_argument(
+            '--formats', nargs='+', choices=FORMATS, default=list(FORMATS))
+        parser.add_argument('--iterations', type=int, default=10)
+        parser.add_argument('--output', help='Файл для JSON-отчёта')
+
+    def fill_cart(self, size):
+        recipe_ids = list(Recipe.objects.order_by(
+            '-pub_date', '-id').values_list('id', flat=True)[:size])
+        if len(recipe_ids) < size:
+            raise CommandError(
+                f'В базе {len(recipe_ids)} рецептов, нужно {size}: '
+                'выполните generate_data')
+        user = User.objects.create_user(
+            username='benchmark_shopping_list',
+            email='benchmark_shopping_list@example.com',
+            first_name='Benchmark',
+            last_name='Shopping list',
+        )
+        BuyLists.objects.bulk_create(
+            BuyLists(user=user, recipe_id=recipe_id)
+            for recipe_id in recipe_ids
+        )
+        rebuild_shopping_lists([user.id])
+        return user
+
+    def download(self, client, token, file_format):
+        started = time.perf_counter()
+        response = client.get(
+            '/api/recipes/download_shopping_cart/',
+            {'format': file_format},
+            HTTP_AUTHORIZATION=f'Token {token}',
+        )
+        size = sum(len(chunk) for chunk in response.streaming_content)
+        elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{file_format}: {response.status_code}')
+        return elapsed, size
+
+    def run_case(self, size, file_format, iterations):
+        """Один размер и формат в текущем процессе. ru_maxrss - пик
+        за всю жизнь процесса, поэтому здесь нет других замеров."""
+        with transaction.atomic():
+            user = self.fill_cart(size)
+            items = user.shopping_list.count()
+            token = Token.objects.create(user=user)
+            client = Client()
+            rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            timings = []
+            with temporary_metrics(), override_settings(
+                    THROTTLE_RATES={}, CONCURRENCY_LIMITS={}):
+                for _ in range(iterations):
+                    elapsed, length = self.download(
+                        client, token.key, file_format)
+                    timings.append(elapsed * 1000)
+            rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            transaction.set_rollback(True)
+        result = {
+            'recipes': size,
+            'format': file_format,
+            'items': items,
+            'bytes': length,
+            # На Linux ru_maxrss в килобайтах
+            'peak_rss_kb': rss_after,
+            'peak_rss_growth_kb': rss_after - rss_before,
+        }
+        result.update(
+            (f'p{rank}_ms', round(percentile(timings, rank), 3))
+            for rank in PERCENTILES
+        )
+        return result
+
+    def spawn(self, size, file_format, iterations):
+        command = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'),
+            'benchmark_shopping_list',
+            '--sizes', str(size),
+            '--formats', file_format,
+            '--iterations', str(iterations),
+        ]
+        output = subprocess.run(
+            command, check=True, capture_output=True, text=True)
+        return json.loads(output.stdout)['results'][0]
+
+    def handle(self, *args, **options):
+        cases = [
+            (size, file_format)
+            for size in options['sizes']
+            for file_format in options['formats']
+        ]
+        if len(cases) == 1:
+            results = [self.run_case(*cases[0], options['iterations'])]
+        else:
+            results = [
+                self.spawn(size, file_format, options['iterations'])
+                for size, file_format in cases
+            ]
+        report = json.dumps({
+            'iterations': options['iterations'],
+            'results': results,
+        }, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output:
+                output.write(report)
+        else:
+            self.stdout.write(report)
@@ -0,0 +1,27 @@
+from api.images import build_image_variants
+from django.core.management.base import BaseCommand
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Строит уменьшенные копии иллюстраций рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересобрать копии и у рецептов, где они уже есть',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        count = 0
+        for recipe_id, image_name in recipes.values_list(
+            'id', 'image'
+        ).iterator():
+            build_image_variants(recipe_id, image_name)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано иллюстраций: {count}'))
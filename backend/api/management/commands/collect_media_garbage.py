@@ -0,0 +1,66 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from recipes.models import Recipe
+
+MEDIA_DIRS = ('recipe_images',)
+VARIANT_KEYS = ('thumbnail', 'card')
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из media файлы, на которые не ссылается '
+            'ни один рецепт')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: они могут '
+                 'принадлежать ещё не сохранённому рецепту',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def get_referenced(self):
+        referenced = set()
+        for image, variants in Recipe.objects.values_list(
+            'image', 'image_variants'
+        ).iterator():
+            referenced.add(image)
+            referenced.update(
+                variants[key] for key in VARIANT_KEYS if key in variants
+            )
+        return referenced
+
+    def walk(self, path):
+        if not default_storage.exists(path):
+            return
+        directories, files = default_storage.listdir(path)
+        for name in files:
+            yield posixpath.join(path, name)
+        for name in directories:
+            yield from self.walk(posixpath.join(path, name))
+
+    def handle(self, *args, **options):
+        referenced = self.get_referenced()
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        removed = 0
+        for directory in MEDIA_DIRS:
+            for name in self.walk(directory):
+                if name in referenced:
+                    continue
+                if default_storage.get_modified_time(name) > threshold:
+                    continue
+                self.stdout.write(name)
+                if not options['dry_run']:
+                    default_storage.delete(name)
+                removed += 1
+        action = 'Будет удалено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(self.style.SUCCESS(f'{action} файлов: {removed}'))
@@ -0,0 +1,149 @@
+import io
+import random
+
+from api.shopping_list import rebuild_shopping_lists
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from PIL import Image
+from recipes.models import (AmountIngredients, BuyLists, Favourites,
+                            Ingredient, Recipe, Tag)
+from users.models import Subscriptions
+
+User = get_user_model()
+
+PASSWORD = 'benchmark-password'
+TAG_COLORS = ('#E26C2D', '#49B64E', '#8775D2', '#F5C242', '#2D8CE2')
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = ('Наполняет базу синтетическими данными через bulk_create: '
+            'пользователи, подписки, рецепты с ингредиентами и тегами, '
+            f'избранное и корзины. Пароль всех пользователей: {PASSWORD}')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes-per-user', type=int, default=10)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--tags-per-recipe', type=int, default=2)
+        parser.add_argument('--subscriptions-per-user', type=int, default=20)
+        parser.add_argument('--favourites-per-user', type=int, default=30)
+        parser.add_argument('--cart-per-user', type=int, default=10)
+        parser.add_argument('--tags', type=int, default=len(TAG_COLORS))
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--prefix',
+            default='bench',
+            help='Префикс имён пользователей, чтобы запуски не пересекались',
+        )
+
+    def get_tags(self, count):
+        tags = list(Tag.objects.all()[:count])
+        for number in range(len(tags), count):
+            tags.append(Tag.objects.create(
+                name=f'Тег {number}',
+                slug=f'tag-{number}',
+                color=f'#{random.randrange(16 ** 6):06X}',
+            ))
+        return tags
+
+    def get_image(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (600, 400), '#49B64E').save(buffer, 'JPEG')
+        return default_storage.save(
+            'recipe_images/benchmark.jpg', ContentFile(buffer.getvalue()))
+
+    def sample_pairs(self, user_ids, targets, per_user, allow_self=True):
+        for user_id in user_ids:
+            for target in random.sample(targets, min(per_user, len(targets))):
+                if allow_self or target != user_id:
+                    yield user_id, target
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        random.seed(options['seed'])
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        if not ingredient_ids:
+            raise CommandError(
+                'Нет ингредиентов: сначала выполните load_ingredients')
+        prefix = options['prefix']
+        if User.objects.filter(username__startswith=f'{prefix}_').exists():
+            raise CommandError(
+                f'Пользователи с префиксом {prefix} уже есть, '
+                'укажите другой --prefix')
+        tags = self.get_tags(options['tags'])
+        image = self.get_image()
+        password = make_password(PASSWORD)
+
+        User.objects.bulk_create((
+            User(
+                username=f'{prefix}_{number}',
+                email=f'{prefix}_{number}@example.com',
+                first_name='Имя',
+                last_name='Фамилия',
+                password=password,
+            )
+            for number in range(options['users'])
+        ), batch_size=BATCH_SIZE)
+        user_ids = list(User.objects.filter(
+            username__startswith=f'{prefix}_').values_list('id', flat=True))
+
+        Recipe.objects.bulk_create((
+            Recipe(
+                author_id=user_id,
+                name=f'Рецепт {number}',
+                text='Описание рецепта',
+                image=image,
+                cooking_time=random.randint(1, 120),
+            )
+            for user_id in user_ids
+            for number in range(options['recipes_per_user'])
+        ), batch_size=BATCH_SIZE)
+        recipe_ids = list(Recipe.objects.filter(
+            author__id__in=user_ids).values_list('id', flat=True))
+
+        AmountIngredients.objects.bulk_create((
+            AmountIngredients(
+                recipe_id=recipe_id,
+                ingredients_id=ingredient_id,
+                amount=random.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in random.sample(
+                ingredient_ids,
+                min(options['ingredients_per_recipe'], len(ingredient_ids))
+            )
+        ), batch_size=BATCH_SIZE)
+        recipe_tags = Recipe.tags.through
+        recipe_tags.objects.bulk_create((
+            recipe_tags(recipe_id=recipe_id, tag_id=tag.id)
+            for recipe_id in recipe_ids
+            for tag in random.sample(
+                tags, min(options['tags_per_recipe'], len(tags)))
+        ), batch_size=BATCH_SIZE)
+
+        Subscriptions.objects.bulk_create((
+            Subscriptions(user_id=user_id, author_id=author_id)
+            for user_id, author_id in self.sample_pairs(
+                user_ids, user_ids, options['subscriptions_per_user'],
+                allow_self=False)
+        ), batch_size=BATCH_SIZE)
+        Favourites.objects.bulk_create((
+            Favourites(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in self.sample_pairs(
+                user_ids, recipe_ids, options['favourites_per_user'])
+        ), batch_size=BATCH_SIZE)
+        BuyLists.objects.bulk_create((
+            BuyLists(user_id=user_id, recipe_id=recipe_id)
+            for user_id, recipe_id in self.sample_pairs(
+                user_ids, recipe_ids, options['cart_per_user'])
+        ), batch_size=BATCH_SIZE)
+        rebuild_shopping_lists(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}'))
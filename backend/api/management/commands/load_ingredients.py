@@ -0,0 +1,104 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from api.search import invalidate_ingredient_index
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from recipes.models import Ingredient
+
+DEFAULT_PATH = settings.BASE_DIR.parent / 'data' / 'ingredients.csv'
+
+
+def read_csv(file):
+    for row in csv.reader(file):
+        if len(row) >= 2:
+            yield row[0], row[1]
+        else:
+            yield None
+
+
+def read_json(file):
+    for item in json.load(file):
+        try:
+            yield item['name'], item['measurement_unit']
+        except (KeyError, TypeError):
+            yield None
+
+
+READERS = {
+    'csv': read_csv,
+    'json': read_json,
+}
+
+
+class Command(BaseCommand):
+    help = ('Загружает ингредиенты из CSV (name,measurement_unit) или JSON '
+            'пачками. Уже существующие пары название + единица '
+            'пропускаются, поэтому повторный запуск ничего не меняет.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=str(DEFAULT_PATH),
+        )
+        parser.add_argument(
+            '--format',
+            choices=READERS,
+            help='По умолчанию определяется по расширению файла',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or path.rsplit('.', 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        started = time.perf_counter()
+        try:
+            with open(path, encoding='utf-8') as file:
+                inserted, skipped = self.load(
+                    READERS[file_format](file), options['batch_size'])
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(f'Не удалось прочитать {path}: {error}')
+        invalidate_ingredient_index()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {skipped} '
+            f'за {elapsed:.2f} с'))
+
+    @transaction.atomic
+    def load(self, rows, batch_size):
+        known = set(Ingredient.objects.values_list(
+            'name', 'measurement_unit'))
+        inserted = skipped = 0
+        rows = iter(rows)
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                return inserted, skipped
+            batch = []
+            for row in chunk:
+                key = self.normalize(row)
+                if key is None or key in known:
+                    skipped += 1
+                    continue
+                known.add(key)
+                batch.append(Ingredient(name=key[0], measurement_unit=key[1]))
+            Ingredient.objects.bulk_create(batch)
+            inserted += len(batch)
+
+    def normalize(self, row):
+        if row is None:
+            return None
+        name, measurement_unit = (str(value).strip() for value in row)
+        if not name or not measurement_unit:
+            return None
+        return name, measurement_unit
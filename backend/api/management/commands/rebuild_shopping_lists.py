@@ -0,0 +1,34 @@
+from api.shopping_list import rebuild_shopping_lists, verify_shopping_lists
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает или проверяет сохранённые списки покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Только проверить списки, ничего не меняя',
+        )
+        parser.add_argument(
+            '--user',
+            type=int,
+            nargs='+',
+            dest='user_ids',
+            help='id пользователей, по умолчанию - все',
+        )
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if options['verify']:
+            broken = verify_shopping_lists(user_ids)
+            if broken:
+                raise CommandError(
+                    f'Списки покупок расходятся с корзиной у пользователей: '
+                    f'{", ".join(map(str, broken))}'
+                )
+            self.stdout.write(self.style.SUCCESS('Списки покупок в порядке'))
+            return
+        rebuild_shopping_lists(user_ids)
+        self.stdout.write(self.style.SUCCESS('Списки покупок пересчитаны'))
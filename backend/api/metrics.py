@@ -0,0 +1,336 @@
+"""Метрики эндпоинтов в формате Prometheus.
+
+Каждый процесс gunicorn копит счётчики в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает снимок в свой файл в
+METRICS_DIR. Эндпоинт метрик складывает файлы всех процессов.
+Снимки остановленных воркеров мастер gunicorn переносит в общий
+файл (см. gunicorn.conf.py).
+"""
+
+import asyncio
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.utils.deprecation import MiddlewareMixin
+
+from .queries import observe_queries
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+COUNTERS = {
+    'requests': (
+        'foodgram_http_requests_total',
+        'Количество запросов',
+    ),
+    'queries': (
+        'foodgram_db_queries_total',
+        'Количество SQL-запросов',
+    ),
+    'query_seconds': (
+        'foodgram_db_query_seconds_total',
+        'Время SQL-запросов',
+    ),
+    'response_bytes': (
+        'foodgram_http_response_bytes_total',
+        'Размер ответов',
+    ),
+}
+HISTOGRAM = (
+    'foodgram_http_request_duration_seconds',
+    'Время обработки запроса',
+)
+RETIRED_SNAPSHOT = 'retired.json'
+LOCK_FILE = 'snapshots.lock'
+
+
+class Registry:
+    """Счётчики одного процесса.
+
+    Ключи: (метрика, вьюха, метод) и (метрика, вьюха, метод, статус)
+    для количества запросов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.flushed_at = time.monotonic()
+
+    def add(self, key, value):
+        self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, view, method, status, elapsed, queries, query_time):
+        with self.lock:
+            self.add(('requests', view, method, str(status)), 1)
+            self.add(('queries', view, method), queries)
+            self.add(('query_seconds', view, method), query_time)
+            histogram = self.histograms.setdefault(
+                (view, method), [0] * (len(LATENCY_BUCKETS) + 2))
+            histogram[bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+            histogram[-1] += elapsed
+
+    def add_bytes(self, view, method, size):
+        with self.lock:
+            self.add(('response_bytes', view, method), size)
+
+    def snapshot(self):
+        with self.lock:
+            return make_snapshot(self.counters, self.histograms)
+
+    def flush(self, force=False):
+        """Атомарно записывает снимок в файл процесса."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        write_snapshot(directory, f'{os.getpid()}.json', self.snapshot())
+
+
+registry = Registry()
+
+
+def make_snapshot(counters, histograms):
+    return {
+        'counters': [[*key, value] for key, value in counters.items()],
+        'histograms': [
+            [*key, list(value)] for key, value in histograms.items()
+        ],
+    }
+
+
+def write_snapshot(directory, name, snapshot):
+    descriptor, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(descriptor, 'w') as file:
+        json.dump(snapshot, file)
+    os.replace(path, os.path.join(directory, name))
+
+
+def load_snapshot(path):
+    try:
+        with open(path) as snapshot:
+            return json.load(snapshot)
+    except (OSError, ValueError):
+        # Файл процесса мог смениться между listdir и open
+        return None
+
+
+@contextmanager
+def snapshots_lock(directory, exclusive=False):
+    """Пока мастер переносит снимок воркера в общий файл, эндпоинт
+    не читает каталог, иначе увидел бы снимок дважды или ни разу."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def read_snapshots():
+    """Снимки всех процессов, включая текущий."""
+    registry.flush(force=True)
+    directory = settings.METRICS_DIR
+    with snapshots_lock(directory):
+        for name in os.listdir(directory):
+            if not name.endswith('.json'):
+                continue
+            snapshot = load_snapshot(os.path.join(directory, name))
+            if snapshot is not None:
+                yield snapshot
+
+
+def retire_workers(pids=None):
+    """Складывает снимки остановленных воркеров в retired.json и
+    удаляет их файлы, без pids - все файлы прошлого запуска.
+
+    Иначе файлы копились бы, а воркер с тем же pid перезаписал бы
+    снимок предшественника, и суммы счётчиков уменьшились бы.
+    Вызывается только из мастера gunicorn.
+    """
+    directory = settings.METRICS_DIR
+    with snapshots_lock(directory, exclusive=True):
+        if pids is None:
+            # Вместе с недописанными .tmp упавших процессов
+            names = [
+                name for name in os.listdir(directory)
+                if name.endswith(('.json', '.tmp'))
+                and name != RETIRED_SNAPSHOT
+            ]
+        else:
+            names = [f'{pid}.json' for pid in pids]
+        paths = [
+            path for path in (os.path.join(directory, name) for name in names)
+            if os.path.exists(path)
+        ]
+        if not paths:
+            return
+        snapshots = (
+            load_snapshot(path)
+            for path in (os.path.join(directory, RETIRED_SNAPSHOT), *paths)
+            if path.endswith('.json')
+        )
+        write_snapshot(directory, RETIRED_SNAPSHOT, make_snapshot(
+            *merge_snapshots(
+                snapshot for snapshot in snapshots if snapshot is not None)
+        ))
+        for path in paths:
+            os.remove(path)
+
+
+def merge_snapshots(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for *key, value in snapshot['counters']:
+            key = tuple(key)
+            counters[key] = counters.get(key, 0) + value
+        for view, method, values in snapshot['histograms']:
+            total = histograms.setdefault(
+                (view, method), [0] * len(values))
+            for index, value in enumerate(values):
+                total[index] += value
+    return counters, histograms
+
+
+def format_labels(**labels):
+    return ','.join(
+        '{}="{}"'.format(
+            name,
+            str(value).replace('\\', '\\\\').replace('"', '\\"'),
+        )
+        for name, value in labels.items()
+    )
+
+
+def render_metrics(counters, histograms):
+    lines = []
+    for metric, (name, description) in COUNTERS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} counter')
+        for key, value in sorted(counters.items()):
+            if key[0] != metric:
+                continue
+            labels = {'view': key[1], 'method': key[2]}
+            if len(key) > 3:
+                labels['status'] = key[3]
+            lines.append(f'{name}{{{format_labels(**labels)}}} {value}')
+    name, description = HISTOGRAM
+    lines.append(f'# HELP {name} {description}')
+    lines.append(f'# TYPE {name} histogram')
+    for (view, method), values in sorted(histograms.items()):
+        cumulative = 0
+        for bound, count in zip((*LATENCY_BUCKETS, '+Inf'), values):
+            cumulative += count
+            labels = format_labels(view=view, method=method, le=bound)
+            lines.append(f'{name}_bucket{{{labels}}} {cumulative}')
+        labels = format_labels(view=view, method=method)
+        lines.append(f'{name}_sum{{{labels}}} {values[-1]}')
+        lines.append(f'{name}_count{{{labels}}} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+def get_view_name(request):
+    """Имя вьюхи с действием: RecipeViewSet.list,
+    RecipeViewSet.download_shopping_cart."""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    view = match.func
+    cls = getattr(view, 'cls', None) or getattr(view, 'view_class', None)
+    if cls is None:
+        return match.view_name
+    actions = getattr(view, 'actions', None) or {}
+    action = actions.get(request.method.lower())
+    if action is None:
+        return cls.__name__
+    return f'{cls.__name__}.{action}'
+
+
+class QueryTimer:
+    """execute_wrapper, считающий число и время SQL-запросов."""
+
+    def __init__(self):
+        self.count = 0
+        self.elapsed = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.elapsed += time.perf_counter() - started
+
+
+def count_streaming_bytes(content, view, method):
+    size = 0
+    for chunk in content:
+        size += len(chunk)
+        yield chunk
+    registry.add_bytes(view, method, size)
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Пишет для каждого запроса количество, время, SQL-запросы и
+    размер ответа с разбивкой по вьюхам. Работает и под ASGI."""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        started = time.perf_counter()
+        with observe_queries(QueryTimer()) as timer:
+            response = self.get_response(request)
+        return self.record(request, response, started, timer)
+
+    async def acall(self, request):
+        started = time.perf_counter()
+        with observe_queries(QueryTimer()) as timer:
+            response = await self.get_response(request)
+        return self.record(request, response, started, timer)
+
+    def record(self, request, response, started, timer):
+        elapsed = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.func is metrics:
+            return response
+        view = get_view_name(request)
+        method = request.method
+        registry.observe(
+            view, method, response.status_code,
+            elapsed, timer.count, timer.elapsed,
+        )
+        if response.has_header('Content-Length'):
+            registry.add_bytes(view, method, int(response['Content-Length']))
+        elif response.streaming:
+            response.streaming_content = count_streaming_bytes(
+                response.streaming_content, view, method)
+        else:
+            registry.add_bytes(view, method, len(response.content))
+        registry.flush()
+        return response
+
+
+def metrics(request):
+    """Отдаёт метрики всех процессов по токену из METRICS_TOKEN.
+
+    Без токена в настройках эндпоинт выключен.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not constant_time_compare(header, f'Bearer {token}'):
+        raise Http404
+    counters, histograms = merge_snapshots(read_snapshots())
+    return HttpResponse(
+        render_metrics(counters, histograms), content_type=CONTENT_TYPE)
@@ -0,0 +1,109 @@
+"""Пагинация"""
+
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(PageNumberPagination):
+    """Постраничная пагинация с курсорным режимом по запросу.
+
+    Если в запросе есть параметр cursor (для первой страницы - пустой),
+    страница выбирается по ключу (date_field, id) по убыванию без COUNT и
+    OFFSET, поэтому далёкие страницы стоят столько же, сколько первая.
+    В ответе остаются next, previous и results.
+    """
+    cursor_query_param = 'cursor'
+    date_field = 'pub_date'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = self.cursor_query_param in request.query_params
+        if not self.cursor_mode:
+            return super().paginate_queryset(queryset, request, view)
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.query_params[self.cursor_query_param]
+        )
+        ordering = (f'-{self.date_field}', '-id')
+        if reverse:
+            ordering = (self.date_field, 'id')
+        if position is not None:
+            date, pk = position
+            lookup = 'gt' if reverse else 'lt'
+            queryset = queryset.filter(
+                Q(**{f'{self.date_field}__{lookup}': date})
+                | Q(**{self.date_field: date, f'id__{lookup}': pk})
+            )
+        results = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page_results = results
+        return results
+
+    def get_paginated_response(self, data):
+        if not self.cursor_mode:
+            return super().get_paginated_response(data)
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.cursor_mode:
+            return super().get_next_link()
+        if not self.has_next or not self.page_results:
+            return None
+        return self.build_link(self.page_results[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.cursor_mode:
+            return super().get_previous_link()
+        if not self.has_previous or not self.page_results:
+            return None
+        return self.build_link(self.page_results[0], reverse=True)
+
+    def build_link(self, obj, reverse):
+        position = (getattr(obj, self.date_field).isoformat(), obj.id)
+        url = remove_query_param(self.base_url, self.page_query_param)
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(position, reverse)
+        )
+
+    def encode_cursor(self, position, reverse):
+        data = json.dumps({'p': position, 'r': reverse})
+        return b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None, False
+        try:
+            data = json.loads(b64decode(cursor.encode(), validate=True))
+            date, pk = data['p']
+            date = parse_datetime(date)
+            if date is None:
+                raise ValueError('Неверная дата в курсоре')
+            return (date, int(pk)), bool(data['r'])
+        except (BinasciiError, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class SubscriptionsPagination(KeysetPagination):
+    date_field = 'subscription_date'
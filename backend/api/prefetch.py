@@ -0,0 +1,13 @@
+"""Общий план подгрузки связей рецепта"""
+
+from django.db.models import Prefetch
+from recipes.models import AmountIngredients, Tag
+
+RECIPE_SELECT_RELATED = ('author',)
+RECIPE_PREFETCH_RELATED = (
+    Prefetch('tags', queryset=Tag.objects.all()),
+    Prefetch(
+        'ingredient',
+        queryset=AmountIngredients.objects.select_related('ingredients')
+    ),
+)
@@ -0,0 +1,270 @@
+"""Профилирование отдельного запроса по требованию.
+
+Включается заголовком X-Profile: 1 или параметром ?profile=1, только
+для staff. Отчёт сохраняется в кэш, ссылка на него приходит в
+заголовке X-Profile-Url. Без флага middleware ничего не делает.
+"""
+
+import asyncio
+import threading
+import time
+import traceback
+import uuid
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework import exceptions, serializers
+from rest_framework.permissions import IsAdminUser
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.views import APIView
+
+from . import queries
+from .queries import observe_queries
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+PROFILE_KEY = 'profile:{}'
+
+current_profile = ContextVar('current_profile', default=None)
+patch_lock = threading.Lock()
+active_profiles = 0
+rendered_content = Response.rendered_content
+
+
+class Profile:
+    def __init__(self, request):
+        self.request = request
+        self.queries = []
+        self.fields = {}
+        self.render_time = 0.0
+        self.started = time.perf_counter()
+
+    def add_timing(self, name, elapsed):
+        calls, total = self.fields.get(name, (0, 0.0))
+        self.fields[name] = (calls + 1, total + elapsed)
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params),
+                'time_ms': round((time.perf_counter() - started) * 1000, 3),
+                'source': get_source(),
+            })
+
+    def report(self, elapsed, status):
+        by_sql = Counter(query['sql'] for query in self.queries)
+        by_params = Counter(
+            (query['sql'], query['params']) for query in self.queries)
+        for query in self.queries:
+            query['similar'] = by_sql[query['sql']]
+            query['duplicates'] = by_params[query['sql'], query['params']]
+        return {
+            'method': self.request.method,
+            'path': self.request.get_full_path(),
+            'status': status,
+            'total_ms': round(elapsed * 1000, 3),
+            'sql_ms': round(sum(q['time_ms'] for q in self.queries), 3),
+            'render_ms': round(self.render_time * 1000, 3),
+            'queries': self.queries,
+            'duplicate_queries': sum(
+                count - 1 for count in by_params.values()),
+            'similar_queries': sum(count - 1 for count in by_sql.values()),
+            # Время вложенных сериализаторов включает время их полей
+            'serializer_fields': sorted(
+                (
+                    {
+                        'field': name,
+                        'calls': calls,
+                        'total_ms': round(total * 1000, 3),
+                    }
+                    for name, (calls, total) in self.fields.items()
+                ),
+                key=lambda field: field['total_ms'],
+                reverse=True,
+            ),
+        }
+
+
+def get_source():
+    """Ближайший к SQL-запросу кадр из кода проекта."""
+    base_dir = str(settings.BASE_DIR)
+    for frame in reversed(traceback.extract_stack()[:-3]):
+        if (frame.filename.startswith(base_dir)
+                and frame.filename not in (__file__, queries.__file__)
+                and 'site-packages' not in frame.filename):
+            return f'{frame.filename[len(base_dir) + 1:]}:{frame.lineno}'
+    return None
+
+
+def get_field_name(field):
+    parent = field.parent
+    if isinstance(parent, serializers.ListSerializer):
+        field, parent = parent, parent.parent
+    owner = type(parent).__name__ if parent is not None else ''
+    return f'{owner}.{field.field_name}'
+
+
+def timed(original, get_name):
+    @wraps(original)
+    def wrapper(self, *args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return original(self, *args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return original(self, *args, **kwargs)
+        finally:
+            name = get_name(self)
+            if name is not None:
+                profile.add_timing(name, time.perf_counter() - started)
+    return wrapper
+
+
+def get_nested_name(serializer):
+    # Сериализатор верхнего уровня и элементы списка не считаем отдельно
+    if serializer.parent is None or isinstance(
+            serializer.parent, serializers.ListSerializer):
+        return None
+    return f'{get_field_name(serializer)} ({type(serializer).__name__})'
+
+
+def get_list_name(serializer):
+    if serializer.parent is None:
+        return None
+    return f'{get_field_name(serializer)} ({type(serializer.child).__name__})'
+
+
+PATCHES = (
+    (serializers.SerializerMethodField, 'to_representation',
+     get_field_name),
+    (serializers.Serializer, 'to_representation', get_nested_name),
+    (serializers.ListSerializer, 'to_representation', get_list_name),
+)
+
+
+def render(response):
+    started = time.perf_counter()
+    try:
+        return rendered_content.fget(response)
+    finally:
+        profile = current_profile.get()
+        if profile is not None:
+            profile.render_time += time.perf_counter() - started
+
+
+def install_patches():
+    """Обёртки ставятся только на время профилирования."""
+    global active_profiles
+    with patch_lock:
+        if not active_profiles:
+            for cls, name, get_name in PATCHES:
+                setattr(cls, name, timed(cls.__dict__[name], get_name))
+            Response.rendered_content = property(render)
+        active_profiles += 1
+
+
+def remove_patches():
+    global active_profiles
+    with patch_lock:
+        active_profiles -= 1
+        if not active_profiles:
+            for cls, name, _ in PATCHES:
+                setattr(cls, name, cls.__dict__[name].__wrapped__)
+            Response.rendered_content = rendered_content
+
+
+def profiling_requested(request):
+    return (
+        request.META.get(PROFILE_HEADER) == '1'
+        or request.GET.get(PROFILE_PARAM) == '1'
+    )
+
+
+def is_staff(request):
+    """Проверяет токен так же, как API, чтобы профилировать
+    запросы фронтенда без сессии."""
+    if getattr(request, 'user', None) is not None and request.user.is_staff:
+        return True
+    drf_request = Request(request, authenticators=[
+        authenticator()
+        for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    ])
+    try:
+        return drf_request.user.is_staff
+    except exceptions.APIException:
+        return False
+
+
+class ProfilingMiddleware(MiddlewareMixin):
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        if not profiling_requested(request) or not is_staff(request):
+            return self.get_response(request)
+        profile, token = self.start(request)
+        try:
+            with observe_queries(profile.execute):
+                response = self.get_response(request)
+        finally:
+            self.stop(token)
+        return self.save(profile, response)
+
+    async def acall(self, request):
+        if not profiling_requested(request) or not await sync_to_async(
+                is_staff)(request):
+            return await self.get_response(request)
+        profile, token = self.start(request)
+        try:
+            with observe_queries(profile.execute):
+                response = await self.get_response(request)
+        finally:
+            self.stop(token)
+        return self.save(profile, response)
+
+    def start(self, request):
+        profile = Profile(request)
+        token = current_profile.set(profile)
+        install_patches()
+        return profile, token
+
+    def stop(self, token):
+        remove_patches()
+        current_profile.reset(token)
+
+    def save(self, profile, response):
+        elapsed = time.perf_counter() - profile.started
+        profile_id = uuid.uuid4().hex
+        cache.set(
+            PROFILE_KEY.format(profile_id),
+            profile.report(elapsed, response.status_code),
+            settings.PROFILE_TTL,
+        )
+        response['X-Profile-Id'] = profile_id
+        response['X-Profile-Url'] = reverse(
+            'api:profile', kwargs={'profile_id': profile_id})
+        return response
+
+
+class ProfileView(APIView):
+    """Сохранённый отчёт профилировщика."""
+
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request, profile_id):
+        report = cache.get(PROFILE_KEY.format(profile_id))
+        if report is None:
+            return Response(status=404)
+        return Response(report)
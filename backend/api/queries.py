@@ -0,0 +1,34 @@
+"""Наблюдение за SQL-запросами текущего HTTP-запроса.
+
+Обёртка ставится на каждое соединение при его создании и передаёт
+запросы наблюдателям из контекстной переменной. sync_to_async копирует
+контекст в поток, поэтому запросы из пула потоков под ASGI попадают
+к наблюдателям своего HTTP-запроса.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+
+query_observers = ContextVar('query_observers', default=())
+
+
+def execute_with_observers(execute, sql, params, many, context):
+    for observer in query_observers.get():
+        execute = partial(observer, execute)
+    return execute(sql, params, many, context)
+
+
+def install_observers(connection):
+    if execute_with_observers not in connection.execute_wrappers:
+        connection.execute_wrappers.append(execute_with_observers)
+
+
+@contextmanager
+def observe_queries(observer):
+    """observer - функция с сигнатурой execute_wrapper."""
+    token = query_observers.set((*query_observers.get(), observer))
+    try:
+        yield observer
+    finally:
+        query_observers.reset(token)
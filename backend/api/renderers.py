@@ -0,0 +1,38 @@
+"""Рендереры для выгрузки списка покупок"""
+
+from rest_framework.renderers import JSONRenderer
+
+
+class ShoppingListRenderer(JSONRenderer):
+    """Сам файл отдаётся потоком из вьюхи, через рендерер проходят
+    только ответы с ошибками, поэтому они выводятся как JSON."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            # Response уже выставил заголовок по media_type формата
+            response['Content-Type'] = JSONRenderer.media_type
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'application/pdf'
+    format = 'pdf'
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+SHOPPING_LIST_RENDERERS = (
+    PDFShoppingListRenderer,
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    JSONRenderer,
+)
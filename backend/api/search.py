@@ -0,0 +1,180 @@
+"""Поиск ингредиентов по индексу в памяти процесса"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from recipes.models import Ingredient
+
+from .cache import is_local_cache
+
+INDEX_VERSION_KEY = 'ingredient_index:version'
+FUZZY_THRESHOLD = 0.3
+FUZZY_MIN_SHARED = 2
+
+
+def get_trigrams(text):
+    """Триграммы строки с отступами по краям, как в pg_trgm."""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def get_edit_distance(first, second, limit):
+    """Расстояние Левенштейна с учётом перестановки соседних букв.
+
+    Если расстояние больше limit, возвращает limit + 1.
+    """
+    previous, current = None, list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        before, previous = previous, current
+        current = [i] + [0] * len(second)
+        for j in range(1, len(second) + 1):
+            cost = first[i - 1] != second[j - 1]
+            current[j] = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + cost,
+            )
+            if (
+                i > 1 and j > 1 and first[i - 1] == second[j - 2]
+                and first[i - 2] == second[j - 1]
+            ):
+                current[j] = min(current[j], before[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+    return current[-1]
+
+
+class IngredientIndex:
+    """Отсортированный список названий и таблица триграмм.
+
+    Сначала выдаются совпадения по началу названия, затем по подстроке,
+    затем похожие названия с опечатками.
+    """
+    def __init__(self, ingredients):
+        self.ingredients = sorted(
+            ingredients, key=lambda item: (item.name.casefold(), item.id)
+        )
+        self.keys = [item.name.casefold() for item in self.ingredients]
+        self.trigrams = defaultdict(set)
+        self.trigram_counts = []
+        for position, key in enumerate(self.keys):
+            key_trigrams = get_trigrams(key)
+            self.trigram_counts.append(len(key_trigrams))
+            for trigram in key_trigrams:
+                self.trigrams[trigram].add(position)
+
+    def find_prefix(self, query):
+        start = bisect_left(self.keys, query)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(query):
+            end += 1
+        return range(start, end)
+
+    def find_substring(self, query, exclude):
+        if len(query) < 3:
+            candidates = range(len(self.keys))
+        else:
+            inner = [
+                self.trigrams.get(query[i:i + 3], set())
+                for i in range(len(query) - 2)
+            ]
+            candidates = set.intersection(*inner)
+        matches = [
+            position for position in candidates
+            if position not in exclude and query in self.keys[position]
+        ]
+        return sorted(
+            matches,
+            key=lambda position: (self.keys[position].index(query), position)
+        )
+
+    def find_fuzzy(self, query, exclude):
+        """Похожие названия: по доле общих триграмм или по числу
+        опечаток в начале названия."""
+        query_trigrams = get_trigrams(query)
+        max_distance = len(query) // 3
+        shared = defaultdict(int)
+        for trigram in query_trigrams:
+            for position in self.trigrams.get(trigram, ()):
+                shared[position] += 1
+        scored = []
+        for position, count in shared.items():
+            if position in exclude or count < FUZZY_MIN_SHARED:
+                continue
+            similarity = count / (
+                len(query_trigrams) + self.trigram_counts[position] - count
+            )
+            distance = get_edit_distance(
+                query, self.keys[position][:len(query)], max_distance)
+            if similarity >= FUZZY_THRESHOLD or distance <= max_distance:
+                scored.append((distance, -similarity, position))
+        return [position for *_, position in sorted(scored)]
+
+    def search(self, query, limit):
+        query = query.strip().casefold()
+        if not query:
+            return []
+        found = list(self.find_prefix(query))
+        if len(found) < limit:
+            found += self.find_substring(query, set(found))
+        if len(found) < limit and len(query) >= 3:
+            found += self.find_fuzzy(query, set(found))
+        return [self.ingredients[position] for position in found[:limit]]
+
+
+_index = None
+_index_version = None
+_index_built = None
+_index_lock = threading.Lock()
+
+
+def is_index_stale(version, now):
+    if _index is None or _index_version != version:
+        return True
+    # Версию в кэше процесса меняет только тот процесс, где изменились
+    # ингредиенты (воркер с админкой, load_ingredients), остальные
+    # пересобирают индекс по возрасту
+    return (
+        is_local_cache()
+        and now - _index_built >= settings.LOCAL_CACHE_TIMEOUT
+    )
+
+
+def get_ingredient_index():
+    """Возвращает индекс, пересобирая его после изменения ингредиентов.
+
+    Версия индекса хранится в кэше, поэтому при общем кэше
+    изменения видны всем процессам. С кэшем в памяти процесса индекс
+    ещё и пересобирается раз в LOCAL_CACHE_TIMEOUT секунд.
+    """
+    global _index, _index_version, _index_built
+    version = cache.get(INDEX_VERSION_KEY, 0)
+    if is_index_stale(version, time.monotonic()):
+        with _index_lock:
+            now = time.monotonic()
+            if is_index_stale(version, now):
+                # Версия меняется после записи в основную базу, реплика
+                # может её ещё не видеть
+                _index = IngredientIndex(
+                    Ingredient.objects.using(DEFAULT_DB_ALIAS))
+                _index_version = version
+                _index_built = now
+    return _index
+
+
+def search_ingredients(query, limit=None):
+    if limit is None:
+        limit = settings.INGREDIENT_SEARCH_LIMIT
+    return get_ingredient_index().search(query, limit)
+
+
+def invalidate_ingredient_index():
+    try:
+        cache.incr(INDEX_VERSION_KEY)
+    except ValueError:
+        cache.set(INDEX_VERSION_KEY, 1, None)
@@ -1,10 +1,21 @@
+from collections import OrderedDict
+
 from django.contrib.auth import get_user_model
+from django.db import models, transaction
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from recipes.models import AmountIngredients, Ingredient, Recipe, Tag
+from recipes.models import (AmountIngredients, BuyLists, Favourites,
+                            Ingredient, Recipe, Tag)
 from rest_framework import serializers
 from users.models import MyUser, Subscriptions
 
-from .fields import Base64ImageField, Hex2NameColor
+from .cache import (get_recipe_fragments, get_subscribed_author_ids,
+                    set_recipe_fragments)
+from .fields import (Base64ImageField, BulkPrimaryKeyRelatedField,
+                     Hex2NameColor, ImageVariantsField, get_objects_by_pks)
+from .images import schedule_image_variants
+from .prefetch import RECIPE_PREFETCH_RELATED
+from .shopping_list import change_shopping_lists, get_cart_user_ids
 
 User = get_user_model()
 
@@ -43,30 +54,27 @@ class UserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
-        if request is not None:
-            current_user = request.user
-            if current_user.is_authenticated:
-                return Subscriptions.objects.filter(
-                    user=current_user,
-                    author=obj
-                ).exists()
-        return False
+        if request is None or not request.user.is_authenticated:
+            return False
+        if 'subscribed_author_ids' not in self.context:
+            self.context['subscribed_author_ids'] = (
+                get_subscribed_author_ids(request.user)
+            )
+        return obj.id in self.context['subscribed_author_ids']
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
 class UserSubscriptionsSerializer(serializers.ModelSerializer):
     author = UserSerializer()
-    recipes = ShortRecipeSerializer(
-        many=True,
-        read_only=True,
-        source='author.recipes')
+    recipes = serializers.SerializerMethodField(read_only=True)
     recipes_count = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
@@ -74,16 +82,21 @@ class UserSubscriptionsSerializer(serializers.ModelSerializer):
         fields = ('author', 'recipes', 'recipes_count')
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = Recipe.objects.filter(author=obj.author)
-        if limit:
-            recipes = recipes[:int(limit)]
-        serializer = SubscribeRecipeSerializer(recipes, many=True)
+        recipes = getattr(obj.author, 'limited_recipes', None)
+        if recipes is None:
+            request = self.context.get('request')
+            limit = request.query_params.get('recipes_limit')
+            recipes = Recipe.objects.filter(author=obj.author)
+            if limit and limit.isdecimal():
+                recipes = recipes[:int(limit)]
+        serializer = ShortRecipeSerializer(recipes, many=True)
         return serializer.data
 
     def get_recipes_count(self, obj):
-        return Recipe.objects.filter(author=obj.author).count()
+        recipes_count = getattr(obj, 'recipes_count', None)
+        if recipes_count is None:
+            return Recipe.objects.filter(author=obj.author).count()
+        return recipes_count
 
     def to_representation(self, instance):
         representation = super().to_representation(instance)
@@ -127,14 +140,27 @@ class IngredientRecipeReadSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'amount', 'measurement_unit')
 
 
+class IngredientRecipeCreateListSerializer(serializers.ListSerializer):
+    """Заменяет id на ингредиенты одним запросом на весь список."""
+    def to_internal_value(self, data):
+        items = super().to_internal_value(data)
+        ingredients = get_objects_by_pks(
+            Ingredient.objects.all(),
+            [item['id'] for item in items]
+        )
+        for item, ingredient in zip(items, ingredients):
+            item['id'] = ingredient
+        return items
+
+
 class IngredientRecipeCreateSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all(),)
+    id = serializers.IntegerField()
     amount = serializers.IntegerField()
 
     class Meta:
         model = AmountIngredients
         fields = ('id', 'amount')
+        list_serializer_class = IngredientRecipeCreateListSerializer
 
 
 class FavouriteSerializer(serializers.ModelSerializer):
@@ -155,7 +181,19 @@ class SubscribeRecipeSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'image', 'cooking_time',)
 
 
+class ReadRecipeListSerializer(serializers.ListSerializer):
+    """Берёт фрагменты всей страницы одним обращением к кэшу."""
+    def to_representation(self, data):
+        if isinstance(data, models.Manager):
+            data = data.all()
+        return self.child.represent_many(list(data))
+
+
 class ReadRecipeSerializer(serializers.ModelSerializer):
+    """Общая для всех часть рецепта хранится в кэше фрагментом,
+    поверх него для каждого запроса подставляются флаги пользователя."""
+
+    viewer_fields = ('is_favorited', 'is_in_shopping_cart')
 
     tags = TagSerializer(many=True, read_only=True)
     author = UserSerializer(read_only=True)
@@ -173,6 +211,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
         read_only=True
     )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
@@ -185,6 +224,7 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
@@ -197,33 +237,90 @@ class ReadRecipeSerializer(serializers.ModelSerializer):
             'is_in_shopping_cart',
             'name',
             'image',
+            'image_variants',
             'text',
             'cooking_time'
         )
+        list_serializer_class = ReadRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        fragments = get_recipe_fragments([recipe.id for recipe in recipes])
+        missing = [recipe for recipe in recipes if recipe.id not in fragments]
+        if missing:
+            prefetch_related_objects(missing, *RECIPE_PREFETCH_RELATED)
+            built = {
+                recipe.id: self.build_fragment(recipe) for recipe in missing
+            }
+            set_recipe_fragments(built)
+            fragments.update(built)
+        return [
+            self.add_viewer_fields(fragments[recipe.id], recipe)
+            for recipe in recipes
+        ]
+
+    def build_fragment(self, recipe):
+        fragment = OrderedDict()
+        for field in self._readable_fields:
+            if field.field_name in self.viewer_fields:
+                continue
+            attribute = field.get_attribute(recipe)
+            fragment[field.field_name] = (
+                None if attribute is None
+                else field.to_representation(attribute)
+            )
+        fragment['author'].pop('is_subscribed', None)
+        return fragment
+
+    def add_viewer_fields(self, fragment, recipe):
+        author = OrderedDict(fragment['author'])
+        author['is_subscribed'] = self.fields['author'].get_is_subscribed(
+            recipe.author)
+        data = OrderedDict()
+        for name in self.Meta.fields:
+            if name == 'author':
+                data[name] = author
+            elif name in self.viewer_fields:
+                data[name] = self.fields[name].to_representation(recipe)
+            else:
+                data[name] = fragment[name]
+        return data
 
     def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user.is_anonymous:
-            return False
-        return Recipe.objects.filter(
-            in_favourites__user=user,
-            id=obj.id
-        ).exists()
+        return self.get_viewer_flag(obj, 'is_favorited', Favourites)
 
     def get_is_in_shopping_cart(self, obj):
+        return self.get_viewer_flag(obj, 'is_in_shopping_cart', BuyLists)
+
+    def get_viewer_flag(self, obj, flag, model):
+        """Берёт флаг из аннотации queryset, а если её нет -
+        пакетно загружает его для всех рецептов текущей выборки."""
+        annotated = getattr(obj, flag, None)
+        if annotated is not None:
+            return annotated
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
-        return Recipe.objects.filter(
-            in_buylist__user=user,
-            id=obj.id
-        ).exists()
+        cache = self.context.setdefault('viewer_flags', {})
+        checked, found = cache.setdefault(flag, (set(), set()))
+        if obj.id not in checked:
+            batch = {obj.id}
+            if isinstance(self.parent, serializers.ListSerializer):
+                batch.update(recipe.id for recipe in self.parent.instance)
+            found.update(model.objects.filter(
+                user=user,
+                recipe__id__in=batch
+            ).values_list('recipe__id', flat=True))
+            checked.update(batch)
+        return obj.id in found
 
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     image = Base64ImageField()
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -262,6 +359,14 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
                 'Необходимо выбрать теги!')
         return tags
 
+    def save(self, **kwargs):
+        try:
+            return super().save(**kwargs)
+        finally:
+            image = self.validated_data.get('image')
+            if image is not None:
+                image.close()
+
     def create_ingredients(self, ingredients, recipe, menu_list):
         """Создаёт ингридиент."""
         for ingredient in ingredients:
@@ -272,6 +377,7 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             )
             menu_list.append(recipe_list)
 
+    @transaction.atomic
     def create(self, validated_data):
         """Создаёт рецепт."""
         menu_list = []
@@ -285,25 +391,73 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
             menu_list
         )
         AmountIngredients.objects.bulk_create(menu_list)
+        schedule_image_variants(recipe)
 
         return recipe
 
-    def update(self, instance, validated_data):
-        """Обновляет рецепт."""
-        menu_list = []
-        instance.tags.clear()
-        AmountIngredients.objects.filter(recipe=instance).all().delete()
-        tags = validated_data.pop('tags')
-        for tag in tags:
-            instance.tags.add(tag)
-        self.create_ingredients(
-            validated_data.pop('ingredients'),
-            instance,
-            menu_list
-        )
-        AmountIngredients.objects.bulk_create(menu_list)
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только изменившиеся количества ингредиентов и возвращает
+        разницу {id ингредиента: изменение} для оставшихся и новых."""
+        current = {
+            item.ingredients_id: item
+            for item in AmountIngredients.objects.filter(recipe=recipe)
+        }
+        old_amounts = {
+            ingredient_id: item.amount
+            for ingredient_id, item in current.items()
+        }
+        new_amounts = {
+            ingredient['id'].id: ingredient['amount']
+            for ingredient in ingredients
+        }
+        to_create, to_update = [], []
+        for ingredient_id, amount in new_amounts.items():
+            item = current.get(ingredient_id)
+            if item is None:
+                to_create.append(AmountIngredients(
+                    recipe=recipe,
+                    ingredients_id=ingredient_id,
+                    amount=amount
+                ))
+            elif item.amount != amount:
+                item.amount = amount
+                to_update.append(item)
+        to_delete = [
+            item.id for ingredient_id, item in current.items()
+            if ingredient_id not in new_amounts
+        ]
+        if to_delete:
+            # Убранные ингредиенты вычитает из списков покупок
+            # сигнал post_delete
+            AmountIngredients.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            AmountIngredients.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            AmountIngredients.objects.bulk_create(to_create)
+        return {
+            ingredient_id: amount - old_amounts.get(ingredient_id, 0)
+            for ingredient_id, amount in new_amounts.items()
+        }
 
-        return super().update(instance, validated_data)
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        """Обновляет рецепт, записывая только изменения."""
+        tags = validated_data.pop('tags', None)
+        if tags is not None:
+            instance.tags.set(tags)
+        ingredients = validated_data.pop('ingredients', None)
+        if ingredients is not None:
+            change_shopping_lists(
+                get_cart_user_ids(instance.id),
+                self.update_ingredients(instance, ingredients)
+            )
+        if 'image' in validated_data:
+            validated_data['image_variants'] = {}
+        recipe = super().update(instance, validated_data)
+        if 'image' in validated_data:
+            schedule_image_variants(recipe)
+        return recipe
 
     def to_representation(self, instance):
+        prefetch_related_objects([instance], *RECIPE_PREFETCH_RELATED)
         return ReadRecipeSerializer(instance, context=self.context).data
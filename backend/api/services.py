@@ -1,32 +1,140 @@
 """Служебные функции"""
 
 from api.serializers import ShortRecipeSerializer
-from django.shortcuts import get_object_or_404
-from recipes.models import Recipe
+from api.shopping_list import change_shopping_lists, get_recipe_amounts
+from django.db import connections, router, transaction
+from django.db.models import Count, F, Prefetch, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.db.models.query import prefetch_related_objects
+from django.http import Http404
+from recipes.models import BuyLists, Recipe
 from rest_framework import status
 from rest_framework.response import Response
 
 
+def get_recipes_limit(request):
+    """Возвращает recipes_limit из запроса или None."""
+    limit = request.query_params.get('recipes_limit')
+    if limit and limit.isdecimal() and int(limit) > 0:
+        return int(limit)
+    return None
+
+
+def with_subscription_relations(queryset):
+    """Подгружает автора и число его рецептов в основном запросе."""
+    return queryset.select_related('author').annotate(
+        recipes_count=Count('author__recipes')
+    )
+
+
+def prefetch_subscription_recipes(subscriptions, recipes_limit=None):
+    """Загружает рецепты всех авторов страницы одним запросом.
+
+    При заданном лимите рецепты нумеруются внутри автора через ROW_NUMBER,
+    и в выборку попадают только первые recipes_limit из них.
+    """
+    author_ids = {subscription.author_id for subscription in subscriptions}
+    if not author_ids:
+        # Пустой IN нельзя собрать в SQL для RawSQL
+        return
+    recipes = Recipe.objects.filter(author__id__in=author_ids)
+    if recipes_limit:
+        ranked = recipes.annotate(
+            recipe_rank=Window(
+                expression=RowNumber(),
+                partition_by=[F('author')],
+                order_by=F('pub_date').desc(),
+            )
+        ).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        recipes = Recipe.objects.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) AS ranked '
+            'WHERE ranked.recipe_rank <= %s',
+            (*params, recipes_limit)
+        ))
+    prefetch_related_objects(
+        subscriptions,
+        Prefetch('author__recipes', queryset=recipes,
+                 to_attr='limited_recipes')
+    )
+
+
+def insert_if_absent(model, parent, **values):
+    """Вставляет строку одним INSERT ... ON CONFLICT DO NOTHING, если
+    существует parent. Возвращает число вставленных строк: 0 - строка
+    уже была или parent нет.
+
+    Сигналы post_save не отправляются.
+    """
+    connection = connections[router.db_for_write(model)]
+    obj = model(**values)
+    fields = [
+        field for field in model._meta.local_concrete_fields
+        if not field.primary_key
+    ]
+    columns = ', '.join(
+        connection.ops.quote_name(field.column) for field in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, add=True), connection)
+        for field in fields
+    ]
+    parent_sql, parent_params = parent.values('pk').query.get_compiler(
+        connection=connection).as_sql()
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({columns}) SELECT {placeholders} '
+            f'WHERE EXISTS ({parent_sql}) ON CONFLICT DO NOTHING',
+            (*params, *parent_params),
+        )
+        return cursor.rowcount
+
+
+def delete_rows(queryset):
+    """Удаляет строки одним DELETE с подзапросом, без выборки объектов,
+    которую QuerySet.delete() делает для моделей с сигналами удаления.
+    Возвращает число удалённых строк, сигналы не отправляются.
+
+    Для моделей без сигналов и каскадов хватает queryset.delete().
+    """
+    connection = connections[router.db_for_write(queryset.model)]
+    sql, params = queryset.values('pk').query.get_compiler(
+        connection=connection).as_sql()
+    table = connection.ops.quote_name(queryset.model._meta.db_table)
+    pk = connection.ops.quote_name(queryset.model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({sql})', params)
+        return cursor.rowcount
+
+
 class ActionMethods:
     """Класс для экшн методов добавления и
     удаления рецепта в корзину и избранное во вьюсетах"""
+    @transaction.atomic
     def add_obj(self, model, user, pk=None):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipes = Recipe.objects.filter(id=pk)
+        if not insert_if_absent(model, recipes, user=user, recipe_id=pk):
+            if not recipes.exists():
+                raise Http404
             return Response(
                 {'errors': ('Такой рецепт уже есть')},
                 status=status.HTTP_400_BAD_REQUEST,
             )
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = ShortRecipeSerializer(recipe)
+        if model is BuyLists:
+            change_shopping_lists([user.id], get_recipe_amounts(pk))
+        serializer = ShortRecipeSerializer(recipes.get())
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_obj(self, model, user, pk=None):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-        return Response(
-            {'errors': ('Такого рецепта нет')},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+        # Список покупок после удаления из корзины пересчитывает
+        # сигнал post_delete
+        deleted, _ = model.objects.filter(user=user, recipe__id=pk).delete()
+        if not deleted:
+            return Response(
+                {'errors': ('Такого рецепта нет')},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
@@ -0,0 +1,267 @@
+"""Выгрузка списка покупок в разных форматах"""
+
+import csv
+import json
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+from django.http import FileResponse, StreamingHttpResponse
+from recipes.models import AmountIngredients, BuyLists, ShoppingListIngredients
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+
+FONT_NAME = 'droid-serif'
+FONT_PATH = settings.BASE_DIR / 'fonts' / 'droid-serif.ttf'
+PAGE_TOP = 800
+PAGE_BOTTOM = 50
+LINE_HEIGHT = 25
+LEFT_MARGIN = 75
+CHUNK_SIZE = 2000
+BATCH_SIZE = 1000
+
+
+def get_shopping_list(user):
+    """Читает готовые суммы ингредиентов из корзины пользователя."""
+    return ShoppingListIngredients.objects.filter(
+        user=user, amount__gt=0
+    ).values(
+        'amount',
+        name=F('ingredient__name'),
+        measurement_unit=F('ingredient__measurement_unit'),
+    ).order_by('name')
+
+
+def get_recipe_amounts(recipe_id):
+    """Возвращает {id ингредиента: количество} для рецепта."""
+    return dict(AmountIngredients.objects.filter(
+        recipe__id=recipe_id
+    ).values('ingredients__id').annotate(
+        total=Sum('amount')
+    ).order_by().values_list('ingredients__id', 'total'))
+
+
+def get_cart_user_ids(recipe_id):
+    return list(BuyLists.objects.filter(
+        recipe__id=recipe_id
+    ).values_list('user__id', flat=True))
+
+
+def negate(amounts):
+    return {key: -value for key, value in amounts.items()}
+
+
+def change_cart_item(user_id, recipe_id, sign=1):
+    """Прибавляет рецепт к списку покупок пользователя,
+    при sign=-1 вычитает."""
+    amounts = get_recipe_amounts(recipe_id)
+    change_shopping_lists(
+        [user_id], amounts if sign > 0 else negate(amounts))
+
+
+def change_recipe_ingredient(recipe_id, ingredient_id, delta):
+    """Меняет ингредиент рецепта в списках всех, у кого он в корзине."""
+    change_shopping_lists(
+        get_cart_user_ids(recipe_id), {ingredient_id: delta})
+
+
+@transaction.atomic
+def change_shopping_lists(user_ids, changes):
+    """Прибавляет изменения {id ингредиента: разница}
+    к спискам покупок пользователей.
+
+    Недостающие строки вставляются с нулём без ошибки при конфликте с
+    параллельной вставкой, затем все строки меняются одним UPDATE
+    amount = amount + разница. Строки с нулём не удаляются: прибавка
+    из транзакции, которая ждёт блокировку удаляемой строки, иначе
+    потерялась бы. Их не видно при чтении, убирает их пересборка.
+    """
+    changes = {key: value for key, value in changes.items() if value}
+    user_ids = list(user_ids)
+    if not changes or not user_ids:
+        return
+    ShoppingListIngredients.objects.bulk_create(
+        (
+            ShoppingListIngredients(
+                user_id=user_id, ingredient_id=ingredient_id)
+            for user_id in user_ids
+            for ingredient_id, delta in changes.items()
+            if delta > 0
+        ),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    ShoppingListIngredients.objects.filter(
+        user__id__in=user_ids, ingredient__id__in=changes
+    ).update(amount=F('amount') + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(delta))
+            for ingredient_id, delta in changes.items()
+        ),
+        output_field=IntegerField(),
+    ))
+
+
+def calculate_shopping_lists(user_ids=None):
+    """Считает списки покупок заново по корзинам:
+    {(id пользователя, id ингредиента): количество}."""
+    # Условие по корзине должно быть одним filter(), иначе Django
+    # присоединит in_buylist дважды и количества задвоятся
+    if user_ids is None:
+        amounts = AmountIngredients.objects.filter(
+            recipe__in_buylist__isnull=False)
+    else:
+        amounts = AmountIngredients.objects.filter(
+            recipe__in_buylist__user__id__in=user_ids)
+    rows = amounts.values(
+        user_id=F('recipe__in_buylist__user'),
+        ingredient_id=F('ingredients'),
+    ).annotate(total=Sum('amount')).order_by()
+    return {
+        (row['user_id'], row['ingredient_id']): row['total']
+        for row in rows.iterator()
+    }
+
+
+def get_stored_shopping_lists(user_ids=None):
+    items = ShoppingListIngredients.objects.filter(amount__gt=0)
+    if user_ids is not None:
+        items = items.filter(user__id__in=user_ids)
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in items.values_list(
+            'user__id', 'ingredient__id', 'amount').iterator()
+    }
+
+
+def verify_shopping_lists(user_ids=None):
+    """Возвращает id пользователей, у которых сохранённый
+    список покупок расходится с корзиной."""
+    expected = calculate_shopping_lists(user_ids)
+    stored = get_stored_shopping_lists(user_ids)
+    return sorted({
+        user_id for user_id, ingredient_id in expected.keys() | stored.keys()
+        if expected.get((user_id, ingredient_id))
+        != stored.get((user_id, ingredient_id))
+    })
+
+
+@transaction.atomic
+def rebuild_shopping_lists(user_ids=None):
+    items = ShoppingListIngredients.objects.all()
+    if user_ids is not None:
+        items = items.filter(user__id__in=user_ids)
+    items.delete()
+    ShoppingListIngredients.objects.bulk_create(
+        (
+            ShoppingListIngredients(
+                user_id=user_id,
+                ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for (user_id, ingredient_id), amount
+            in calculate_shopping_lists(user_ids).items()
+        ),
+        batch_size=BATCH_SIZE,
+    )
+
+
+def register_font():
+    """Регистрирует шрифт один раз на процесс."""
+    if FONT_NAME not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(FONT_NAME, FONT_PATH))
+
+
+def format_line(number, item):
+    return (
+        f'{number}. {item["name"]} '
+        f'- {item["amount"]} {item["measurement_unit"]}'
+    )
+
+
+def write_pdf(items, file):
+    """Рисует список на нужном числе страниц."""
+    register_font()
+    pdf_file = canvas.Canvas(file)
+    pdf_file.setFont(FONT_NAME, 24)
+    pdf_file.drawString(200, PAGE_TOP, 'Список покупок')
+    pdf_file.setFont(FONT_NAME, 14)
+    height = PAGE_TOP - 50
+    for number, item in enumerate(items, 1):
+        if height < PAGE_BOTTOM:
+            pdf_file.showPage()
+            pdf_file.setFont(FONT_NAME, 14)
+            height = PAGE_TOP
+        pdf_file.drawString(LEFT_MARGIN, height, format_line(number, item))
+        height -= LINE_HEIGHT
+    pdf_file.showPage()
+    pdf_file.save()
+
+
+def iter_text(items):
+    yield 'Список покупок\n\n'
+    for number, item in enumerate(items, 1):
+        yield format_line(number, item) + '\n'
+
+
+class Echo:
+    """Псевдо-файл, который сразу отдаёт записанную строку."""
+    def write(self, value):
+        return value
+
+
+def iter_csv(items):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'amount', 'measurement_unit'))
+    for item in items:
+        yield writer.writerow(
+            (item['name'], item['amount'], item['measurement_unit'])
+        )
+
+
+def iter_json(items):
+    yield '['
+    for number, item in enumerate(items):
+        if number:
+            yield ','
+        yield json.dumps({
+            'name': item['name'],
+            'measurement_unit': item['measurement_unit'],
+            'amount': item['amount'],
+        }, ensure_ascii=False)
+    yield ']'
+
+
+STREAM_WRITERS = {
+    'txt': iter_text,
+    'csv': iter_csv,
+    'json': iter_json,
+}
+
+
+def shopping_list_response(user, file_format, content_type):
+    """Отдаёт список покупок потоком, не собирая его целиком в памяти.
+
+    PDF сначала пишется во временный файл на диске, а затем
+    отдаётся из него частями.
+    """
+    items = get_shopping_list(user).iterator(chunk_size=CHUNK_SIZE)
+    filename = f'shopping_list.{file_format}'
+    if file_format == 'pdf':
+        file = tempfile.TemporaryFile()
+        write_pdf(items, file)
+        file.seek(0)
+        return FileResponse(
+            file,
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type,
+        )
+    response = StreamingHttpResponse(
+        STREAM_WRITERS[file_format](items),
+        content_type=f'{content_type}; charset=utf-8',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,164 @@
+"""Сброс кэшей и пересчёт списков покупок при изменении данных"""
+
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from import_export.signals import post_import
+from recipes.models import AmountIngredients, BuyLists, Ingredient, Recipe, Tag
+from rest_framework.authtoken.models import Token
+from users.models import MyUser, Subscriptions
+
+from .authentication import invalidate_tokens
+from .cache import (invalidate_recipe_feed, invalidate_recipe_fragments,
+                    invalidate_subscriptions, invalidate_tag_ids)
+from .queries import install_observers
+from .search import invalidate_ingredient_index
+from .shopping_list import change_cart_item, change_recipe_ingredient
+
+
+@receiver((post_save, post_delete), sender=Subscriptions)
+def subscriptions_changed(sender, instance, **kwargs):
+    invalidate_subscriptions(instance.user_id)
+
+
+def recipes_changed(recipe_ids):
+    """Сбрасывает фрагменты рецептов и ленту после коммита, иначе
+    параллельный запрос успеет положить в кэш старые данные."""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+
+    def invalidate():
+        invalidate_recipe_fragments(recipe_ids)
+        invalidate_recipe_feed()
+    transaction.on_commit(invalidate)
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(sender, instance, signal, **kwargs):
+    invalidate_ingredient_index()
+    # При удалении рецепты сбросит каскад по AmountIngredients
+    if signal is post_save:
+        recipes_changed(Recipe.objects.filter(
+            ingredient__ingredients=instance).values_list('id', flat=True))
+
+
+@receiver(post_import)
+def ingredients_imported(sender, model, **kwargs):
+    if model is Ingredient:
+        invalidate_ingredient_index()
+        recipes_changed(Recipe.objects.values_list('id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(sender, **kwargs):
+    invalidate_tag_ids()
+
+
+@receiver((post_save, pre_delete), sender=Tag)
+def tag_recipes_changed(sender, instance, **kwargs):
+    recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    recipes_changed([instance.id])
+
+
+@receiver((post_save, post_delete), sender=AmountIngredients)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    recipes_changed([instance.recipe_id])
+
+
+@receiver(pre_save, sender=BuyLists)
+def cart_item_replaced(sender, instance, raw=False, **kwargs):
+    # Правка существующей строки в админке: старый рецепт вычитается,
+    # новый прибавит post_save
+    if raw or instance.pk is None:
+        return
+    old = BuyLists.objects.filter(pk=instance.pk).values_list(
+        'user_id', 'recipe_id').first()
+    if old is not None:
+        change_cart_item(*old, sign=-1)
+
+
+@receiver(post_save, sender=BuyLists)
+def cart_item_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        change_cart_item(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=BuyLists)
+def cart_item_deleted(sender, instance, **kwargs):
+    """Удаление из корзины, в том числе каскадом от рецепта
+    или пользователя."""
+    change_cart_item(instance.user_id, instance.recipe_id, sign=-1)
+
+
+@receiver(pre_save, sender=AmountIngredients)
+def recipe_amount_replaced(sender, instance, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old = AmountIngredients.objects.filter(pk=instance.pk).values_list(
+        'recipe_id', 'ingredients_id', 'amount').first()
+    if old is not None:
+        recipe_id, ingredient_id, amount = old
+        change_recipe_ingredient(recipe_id, ingredient_id, -amount)
+
+
+@receiver(post_save, sender=AmountIngredients)
+def recipe_amount_saved(sender, instance, raw=False, **kwargs):
+    if not raw:
+        change_recipe_ingredient(
+            instance.recipe_id, instance.ingredients_id, instance.amount)
+
+
+@receiver(post_delete, sender=AmountIngredients)
+def recipe_amount_deleted(sender, instance, **kwargs):
+    """Каскад от рецепта или ингредиента: корзины с рецептом, которые
+    ещё не удалены, теряют ингредиент. Порядок каскада не важен, каждая
+    строка считается по тому, что осталось в базе."""
+    change_recipe_ingredient(
+        instance.recipe_id, instance.ingredients_id, -instance.amount)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action.startswith('post_'):
+            recipes_changed([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        recipes_changed(pk_set)
+    elif action == 'pre_clear':
+        recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver((post_save, post_delete), sender=MyUser)
+def user_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход обновляет только last_login, а профиль без рецептов
+    # в ленте не виден
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    recipes_changed(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    invalidate_tokens([instance.key])
+
+
+@receiver(post_save, sender=MyUser)
+def user_tokens_changed(sender, instance, update_fields=None, **kwargs):
+    """Смена пароля, блокировка и правка профиля сбрасывают
+    закэшированного в токене пользователя."""
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    invalidate_tokens(
+        Token.objects.filter(user=instance).values_list('key', flat=True))
+
+
+@receiver(connection_created)
+def connection_opened(sender, connection, **kwargs):
+    install_observers(connection)
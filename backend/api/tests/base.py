@@ -0,0 +1,103 @@
+"""Общие данные для тестов API"""
+
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from recipes.models import AmountIngredients, Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+IMAGE = 'recipe_images/test.png'
+
+
+def create_users(count, prefix='user'):
+    User.objects.bulk_create(
+        User(
+            username=f'{prefix}{number}',
+            email=f'{prefix}{number}@example.com',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        for number in range(count)
+    )
+    return list(User.objects.filter(
+        username__startswith=prefix).order_by('id'))
+
+
+def create_recipes(authors, tags, ingredients):
+    """По рецепту на автора, в каждом все теги и ингредиенты."""
+    last = Recipe.objects.order_by('-id').values_list('id', flat=True)
+    last_id = last.first() or 0
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=author,
+            name=f'Рецепт {author.username}',
+            text='Описание',
+            image=IMAGE,
+            cooking_time=10,
+        )
+        for author in authors
+    )
+    # В Django 3.2 bulk_create на SQLite не возвращает id
+    recipes = list(Recipe.objects.filter(
+        author__in=authors, id__gt=last_id).order_by('id'))
+    Recipe.tags.through.objects.bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+        for recipe in recipes
+        for tag in tags
+    )
+    AmountIngredients.objects.bulk_create(
+        AmountIngredients(recipe=recipe, ingredients=ingredient, amount=10)
+        for recipe in recipes
+        for ingredient in ingredients
+    )
+    return recipes
+
+
+def create_catalogue(tags=3, ingredients=10):
+    Tag.objects.bulk_create(
+        Tag(name=f'Тег {number}', slug=f'tag-{number}',
+            color=f'#{number:06X}')
+        for number in range(tags)
+    )
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'Ингредиент {number}', measurement_unit='г')
+        for number in range(ingredients)
+    )
+    return (
+        list(Tag.objects.order_by('id')),
+        list(Ingredient.objects.order_by('id')),
+    )
+
+
+class APITestCase(TestCase):
+    """Пустой кэш перед каждым тестом, временные MEDIA_ROOT и
+    METRICS_DIR, копии картинок в текущем потоке и без ограничений
+    частоты запросов."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.metrics_dir = tempfile.mkdtemp()
+        cls.media_override = override_settings(
+            MEDIA_ROOT=cls.media_root,
+            METRICS_DIR=cls.metrics_dir,
+            IMAGE_WORKERS=0,
+            THROTTLE_RATES={},
+            CONCURRENCY_LIMITS={},
+        )
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        shutil.rmtree(cls.metrics_dir, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
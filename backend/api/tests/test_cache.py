@@ -0,0 +1,26 @@
+"""Сроки жизни кэша, который сбрасывают сигналы"""
+
+import tempfile
+
+from api.cache import get_local_timeout
+from django.test import SimpleTestCase, override_settings
+
+
+class LocalTimeoutTests(SimpleTestCase):
+
+    @override_settings(LOCAL_CACHE_TIMEOUT=60)
+    def test_local_cache_caps_timeout(self):
+        self.assertEqual(get_local_timeout(15 * 60), 60)
+        self.assertEqual(get_local_timeout(None), 60)
+        self.assertEqual(get_local_timeout(10), 10)
+
+    @override_settings(LOCAL_CACHE_TIMEOUT=60)
+    def test_shared_cache_keeps_timeout(self):
+        with tempfile.TemporaryDirectory() as location:
+            with override_settings(CACHES={'default': {
+                'BACKEND':
+                    'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': location,
+            }}):
+                self.assertEqual(get_local_timeout(15 * 60), 15 * 60)
+                self.assertIsNone(get_local_timeout(None))
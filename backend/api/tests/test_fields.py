@@ -0,0 +1,51 @@
+"""Декодирование base64-картинок по частям"""
+
+import base64
+import io
+
+from api.fields import Base64ImageField, iter_base64_chunks
+from django.test import SimpleTestCase
+from PIL import Image
+from rest_framework.exceptions import ValidationError
+
+
+def get_image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), '#E26C2D').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class Base64ImageFieldTests(SimpleTestCase):
+
+    def decode(self, encoded):
+        file = Base64ImageField().decode(f'data:image/png;base64,{encoded}')
+        try:
+            return file.read()
+        finally:
+            file.close()
+
+    def test_line_wrapped(self):
+        image = get_image()
+        for encoded in (
+            base64.b64encode(image).decode(),
+            base64.encodebytes(image).decode(),
+            base64.encodebytes(image).decode().replace('\n', '\r\n'),
+        ):
+            self.assertEqual(self.decode(encoded), image)
+            # Границы кусков не совпадают с переводами строк
+            for size in (7, 76, 1000):
+                with self.subTest(size=size):
+                    self.assertEqual(
+                        b''.join(
+                            base64.b64decode(chunk, validate=True)
+                            for chunk in iter_base64_chunks(encoded, size)
+                        ),
+                        image,
+                    )
+
+    def test_invalid(self):
+        encoded = base64.b64encode(get_image()).decode()
+        for broken in (encoded[:-1], '*' + encoded):
+            with self.subTest(broken=broken[:8]):
+                with self.assertRaises(ValidationError):
+                    self.decode(broken)
@@ -0,0 +1,43 @@
+"""Пересборка индекса ингредиентов в других процессах"""
+
+from unittest import mock
+
+from api.search import search_ingredients
+from django.test import override_settings
+from recipes.models import Ingredient
+
+from .base import APITestCase
+
+
+@override_settings(LOCAL_CACHE_TIMEOUT=60)
+class IngredientIndexTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.create(name='морковь', measurement_unit='г')
+
+    def setUp(self):
+        super().setUp()
+        # Индекс общий для процесса, каждый тест начинает без него
+        patcher = mock.patch('api.search._index', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, now):
+        with mock.patch('api.search.time.monotonic', return_value=now):
+            return [
+                ingredient.name for ingredient in search_ingredients('мор')
+            ]
+
+    def test_rebuilt_after_change_in_another_process(self):
+        self.assertEqual(self.search(1000), ['морковь'])
+        # bulk_create не шлёт сигналов, как и запись в другом воркере
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='морошка', measurement_unit='г')])
+        self.assertEqual(self.search(1059), ['морковь'])
+        self.assertEqual(self.search(1060), ['морковь', 'морошка'])
+
+    def test_rebuilt_at_once_after_change_in_this_process(self):
+        self.assertEqual(self.search(1000), ['морковь'])
+        Ingredient.objects.create(name='морошка', measurement_unit='г')
+        self.assertEqual(self.search(1001), ['морковь', 'морошка'])
@@ -0,0 +1,55 @@
+"""Снимки остановленных воркеров не теряются и не копятся"""
+
+import os
+import shutil
+import tempfile
+
+from api.metrics import (merge_snapshots, read_snapshots, retire_workers,
+                         write_snapshot)
+from django.test import SimpleTestCase, override_settings
+
+
+def snapshot(requests):
+    return {
+        'counters': [['requests', 'RetiredView', 'GET', '200', requests]],
+        'histograms': [],
+    }
+
+
+class RetireWorkersTests(SimpleTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def get_requests(self):
+        # Снимок текущего процесса тоже читается, но с другими вьюхами
+        counters, _ = merge_snapshots(read_snapshots())
+        return counters[('requests', 'RetiredView', 'GET', '200')]
+
+    def test_child_exit(self):
+        write_snapshot(self.directory, '101.json', snapshot(3))
+        write_snapshot(self.directory, '102.json', snapshot(2))
+        retire_workers([101])
+        self.assertEqual(self.get_requests(), 5)
+        self.assertFalse(
+            os.path.exists(os.path.join(self.directory, '101.json')))
+        # Новый воркер получил pid остановленного
+        write_snapshot(self.directory, '101.json', snapshot(1))
+        self.assertEqual(self.get_requests(), 6)
+        retire_workers([101, 103])
+        self.assertEqual(self.get_requests(), 6)
+
+    def test_on_starting(self):
+        write_snapshot(self.directory, '101.json', snapshot(3))
+        write_snapshot(self.directory, '102.json', snapshot(2))
+        retire_workers()
+        self.assertEqual(
+            sorted(name for name in os.listdir(self.directory)
+                   if name.endswith('.json')),
+            ['retired.json'],
+        )
+        self.assertEqual(self.get_requests(), 5)
@@ -0,0 +1,117 @@
+"""Число SQL-запросов эндпоинтов не зависит от размера страницы и
+числа ингредиентов в рецепте."""
+
+from unittest import mock
+
+from api.pagination import KeysetPagination
+from recipes.models import BuyLists, Favourites
+from rest_framework.test import APIClient
+from users.models import Subscriptions
+
+from .base import APITestCase, create_catalogue, create_recipes, create_users
+
+SIZES = (6, 50, 200)
+LIST_INGREDIENTS = 5
+
+
+class QueryBudgetTests(APITestCase):
+    """Холодный запрос - с пустым кэшем, тёплый - повторный."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags, cls.ingredients = create_catalogue(ingredients=max(SIZES))
+        cls.user, = create_users(1, prefix='viewer')
+        # Отдельный пользователь с пустой корзиной на каждый размер
+        cls.togglers = dict(zip(SIZES, create_users(
+            len(SIZES), prefix='toggler')))
+        cls.authors = create_users(max(SIZES), prefix='author')
+        cls.recipes = create_recipes(
+            cls.authors, cls.tags, cls.ingredients[:LIST_INGREDIENTS])
+        Favourites.objects.bulk_create(
+            Favourites(user=cls.user, recipe=recipe)
+            for recipe in cls.recipes
+        )
+        BuyLists.objects.bulk_create(
+            BuyLists(user=cls.user, recipe=recipe) for recipe in cls.recipes
+        )
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=cls.user, author=author)
+            for author in cls.authors
+        )
+        # Рецепты с 6, 50 и 200 ингредиентами
+        cls.sized_recipes = {
+            size: create_recipes(
+                create_users(1, prefix=f'sized{size}_'),
+                cls.tags,
+                cls.ingredients[:size],
+            )[0]
+            for size in SIZES
+        }
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assert_budget(self, path, cold, warm):
+        for size in SIZES:
+            with self.subTest(path=path, page_size=size), mock.patch.object(
+                    KeysetPagination, 'page_size', size):
+                self.setUp()
+                with self.assertNumQueries(cold):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(len(response.data['results']), size)
+                with self.assertNumQueries(warm):
+                    self.client.get(path)
+
+    def test_recipe_list(self):
+        # COUNT, страница, подписки зрителя, теги, ингредиенты;
+        # с фрагментами в кэше - только COUNT и страница
+        self.assert_budget('/api/recipes/', cold=5, warm=2)
+
+    def test_recipe_list_cursor(self):
+        self.assert_budget('/api/recipes/?cursor=', cold=4, warm=1)
+
+    def test_favourites_list(self):
+        self.assert_budget('/api/recipes/?is_favorited=1', cold=5, warm=2)
+
+    def test_shopping_cart_list(self):
+        self.assert_budget(
+            '/api/recipes/?is_in_shopping_cart=1', cold=5, warm=2)
+
+    def test_subscriptions(self):
+        # COUNT, страница с авторами и числом рецептов, рецепты авторов,
+        # подписки зрителя (кэшируются)
+        self.assert_budget('/api/users/subscriptions/', cold=4, warm=3)
+        self.assert_budget(
+            '/api/users/subscriptions/?recipes_limit=3', cold=4, warm=3)
+
+    def test_recipe_detail(self):
+        for size, recipe in self.sized_recipes.items():
+            with self.subTest(ingredients=size):
+                self.setUp()
+                with self.assertNumQueries(4):
+                    response = self.client.get(f'/api/recipes/{recipe.id}/')
+                self.assertEqual(len(response.data['ingredients']), size)
+                with self.assertNumQueries(1):
+                    self.client.get(f'/api/recipes/{recipe.id}/')
+
+    def test_favourite_and_cart_toggles(self):
+        for size, recipe in self.sized_recipes.items():
+            self.client.force_authenticate(self.togglers[size])
+            # В тесте transaction.atomic даёт SAVEPOINT и RELEASE
+            for action, add, remove in (
+                ('favorite', 4, 3),
+                # Ещё ингредиенты рецепта и обновление списка покупок,
+                # при удалении сигнал требует выборки строки корзины
+                ('shopping_cart', 9, 8),
+            ):
+                path = f'/api/recipes/{recipe.id}/{action}/'
+                with self.subTest(action=action, ingredients=size):
+                    with self.assertNumQueries(add):
+                        response = self.client.post(path)
+                    self.assertEqual(response.status_code, 201)
+                    with self.assertNumQueries(remove):
+                        response = self.client.delete(path)
+                    self.assertEqual(response.status_code, 204)
@@ -0,0 +1,145 @@
+"""Запросы эндпоинтов не читают большие таблицы целиком"""
+
+import io
+import re
+import unittest
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import (AmountIngredients, BuyLists, Favourites, Recipe,
+                            ShoppingListIngredients, Tag)
+from rest_framework.test import APIClient
+from users.models import MyUser, Subscriptions
+
+from .base import APITestCase, create_catalogue
+
+CHECKED_TABLES = (
+    MyUser._meta.db_table,
+    Recipe._meta.db_table,
+    Recipe.tags.through._meta.db_table,
+    AmountIngredients._meta.db_table,
+    Subscriptions._meta.db_table,
+    Favourites._meta.db_table,
+    BuyLists._meta.db_table,
+    ShoppingListIngredients._meta.db_table,
+)
+EXPLAIN = {
+    'postgresql': 'EXPLAIN ',
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+}
+SEQUENTIAL_SCAN = {
+    'postgresql': r'Seq Scan on "?{table}"?\b',
+    'sqlite': r'\bSCAN (TABLE )?"?{table}"?(?! USING)',
+}
+
+
+@unittest.skipUnless(
+    connection.vendor in SEQUENTIAL_SCAN, 'Нет шаблона плана для этой СУБД')
+class QueryPlanTests(APITestCase):
+    """Планы SELECT, которые выполняют сами вьюсеты, на данных
+    generate_data. COUNT(*) постраничного режима читает всю выборку
+    при любом индексе и не проверяется - для этого есть режим cursor."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_catalogue(tags=5, ingredients=300)
+        call_command(
+            'generate_data',
+            users=300,
+            recipes_per_user=10,
+            subscriptions_per_user=20,
+            favourites_per_user=30,
+            cart_per_user=10,
+            stdout=io.StringIO(),
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        cls.user = MyUser.objects.get(username='bench_0')
+        cls.tags = list(Tag.objects.order_by('id')[:2])
+        cls.recipe = Recipe.objects.order_by('-pub_date', '-id').first()
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def explain(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(EXPLAIN[connection.vendor] + sql)
+            return '\n'.join(
+                ' '.join(map(str, row)) for row in cursor.fetchall())
+
+    def get_scan_patterns(self, sql):
+        # Таблицы в подзапросах планы называют псевдонимами (U0, T3)
+        pattern = SEQUENTIAL_SCAN[connection.vendor]
+        for table in CHECKED_TABLES:
+            names = {table}
+            names.update(re.findall(rf'"{table}" (\w+)', sql))
+            for name in names:
+                yield table, pattern.format(table=re.escape(name))
+
+    def assert_no_sequential_scan(self, path):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertEqual(response.status_code, 200, path)
+        selects = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith('SELECT')
+            and not query['sql'].startswith('SELECT COUNT(*)')
+        ]
+        self.assertTrue(selects, path)
+        for sql in selects:
+            plan = self.explain(sql)
+            for table, pattern in self.get_scan_patterns(sql):
+                if re.search(pattern, plan):
+                    self.fail(
+                        f'{path}: последовательное чтение {table}\n'
+                        f'{sql}\n{plan}'
+                    )
+
+    def test_recipes(self):
+        first, second = self.tags
+        paths = (
+            '/api/recipes/',
+            '/api/recipes/?cursor=',
+            f'/api/recipes/?author={self.recipe.author_id}',
+            f'/api/recipes/?tags={first.slug}',
+            f'/api/recipes/?tags={first.slug}&tags={second.slug}',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            f'/api/recipes/{self.recipe.id}/',
+        )
+        for path in paths:
+            with self.subTest(path=path):
+                self.assert_no_sequential_scan(path)
+
+    def test_recipes_next_cursor(self):
+        # Вторая страница фильтрует по (pub_date < x) OR
+        # (pub_date = x AND id < y)
+        for query in ('', f'&tags={self.tags[0].slug}', '&is_favorited=1'):
+            path = self.client.get(f'/api/recipes/?cursor={query}').data[
+                'next']
+            with self.subTest(path=path):
+                self.assertIsNotNone(path)
+                self.assert_no_sequential_scan(path)
+
+    def test_subscriptions(self):
+        paths = (
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=3',
+            '/api/users/subscriptions/?cursor=&recipes_limit=3',
+        )
+        for path in paths:
+            with self.subTest(path=path):
+                self.assert_no_sequential_scan(path)
+        path = self.client.get(
+            '/api/users/subscriptions/?cursor=').data['next']
+        self.assertIsNotNone(path)
+        self.assert_no_sequential_scan(path)
+
+    def test_download_shopping_cart(self):
+        self.assert_no_sequential_scan(
+            '/api/recipes/download_shopping_cart/?format=txt')
@@ -0,0 +1,115 @@
+"""PATCH рецепта пишет только изменившиеся связи"""
+
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from recipes.models import AmountIngredients
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_catalogue, create_recipes, create_users
+
+# На SQLite tags.set() вставляет через INSERT OR IGNORE
+WRITE = re.compile(
+    r'^(?P<verb>INSERT|UPDATE|DELETE)( OR IGNORE)?( INTO| FROM)? '
+    r'"(?P<table>\w+)"',
+    re.IGNORECASE,
+)
+INGREDIENTS = 'recipes_amountingredients'
+TAGS = 'recipes_recipe_tags'
+SHOPPING_LISTS = 'recipes_shoppinglistingredients'
+RECIPES = 'recipes_recipe'
+
+
+def count_writes(queries):
+    """{(INSERT|UPDATE|DELETE, таблица): число запросов}."""
+    writes = Counter()
+    for query in queries:
+        match = WRITE.match(query['sql'])
+        if match is not None:
+            writes[match.group('verb').upper(), match.group('table')] += 1
+    return writes
+
+
+class RecipeUpdateWritesTests(APITestCase):
+    maxDiff = None
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags, cls.ingredients = create_catalogue(tags=3, ingredients=6)
+        cls.author, cls.buyer = create_users(2)
+        cls.recipe, = create_recipes(
+            [cls.author], cls.tags[:2], cls.ingredients[:4])
+
+    def setUp(self):
+        super().setUp()
+        buyer = APIClient()
+        buyer.force_authenticate(self.buyer)
+        buyer.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def patch(self, tags, ingredients):
+        data = {
+            'tags': [tag.id for tag in tags],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe.id}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        return count_writes(queries.captured_queries)
+
+    def assert_writes(self, writes, expected):
+        # Строка рецепта обновляется всегда
+        self.assertEqual(dict(writes), {('UPDATE', RECIPES): 1, **expected})
+
+    def test_no_changes(self):
+        writes = self.patch(
+            self.tags[:2],
+            [(ingredient, 10) for ingredient in self.ingredients[:4]],
+        )
+        self.assert_writes(writes, {})
+
+    def test_single_amount_change(self):
+        writes = self.patch(
+            self.tags[:2],
+            [(self.ingredients[0], 25)]
+            + [(ingredient, 10) for ingredient in self.ingredients[1:4]],
+        )
+        self.assert_writes(writes, {
+            ('UPDATE', INGREDIENTS): 1,
+            # Вставка недостающих строк, затем amount = amount + разница
+            ('INSERT', SHOPPING_LISTS): 1,
+            ('UPDATE', SHOPPING_LISTS): 1,
+        })
+        self.assertEqual(
+            AmountIngredients.objects.get(
+                recipe=self.recipe, ingredients=self.ingredients[0]).amount,
+            25,
+        )
+
+    def test_add_and_remove(self):
+        writes = self.patch(
+            self.tags[1:3],
+            [(ingredient, 10) for ingredient in self.ingredients[1:5]],
+        )
+        self.assert_writes(writes, {
+            ('INSERT', TAGS): 1,
+            ('DELETE', TAGS): 1,
+            ('INSERT', INGREDIENTS): 1,
+            ('DELETE', INGREDIENTS): 1,
+            # Убранный ингредиент вычитает сигнал удаления,
+            # его строка остаётся с нулём
+            ('INSERT', SHOPPING_LISTS): 1,
+            ('UPDATE', SHOPPING_LISTS): 2,
+        })
+        self.assertEqual(
+            set(self.recipe.ingredient.values_list(
+                'ingredients', flat=True)),
+            {ingredient.id for ingredient in self.ingredients[1:5]},
+        )
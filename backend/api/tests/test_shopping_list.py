@@ -0,0 +1,155 @@
+"""Сохранённые списки покупок совпадают с корзинами"""
+
+import io
+
+from api.shopping_list import (calculate_shopping_lists, change_shopping_lists,
+                               get_stored_shopping_lists,
+                               verify_shopping_lists)
+from django.core.management import call_command
+from recipes.models import (AmountIngredients, BuyLists, Ingredient,
+                            ShoppingListIngredients)
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_catalogue, create_recipes, create_users
+
+
+class ShoppingListTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags, cls.ingredients = create_catalogue(ingredients=3)
+        cls.buyers = create_users(3, prefix='buyer')
+        cls.recipes = create_recipes(
+            create_users(4, prefix='author'), cls.tags, cls.ingredients)
+
+    def setUp(self):
+        super().setUp()
+        # Одни и те же рецепты в нескольких корзинах
+        for buyer in self.buyers:
+            client = APIClient()
+            client.force_authenticate(buyer)
+            for recipe in self.recipes[:3]:
+                response = client.post(
+                    f'/api/recipes/{recipe.id}/shopping_cart/')
+                self.assertEqual(response.status_code, 201)
+        # Последний покупатель убирает один рецепт
+        client.delete(f'/api/recipes/{self.recipes[0].id}/shopping_cart/')
+        last = self.buyers[-1]
+        self.expected = {
+            (buyer.id, ingredient.id): 10 * (2 if buyer == last else 3)
+            for buyer in self.buyers
+            for ingredient in self.ingredients
+        }
+
+    def test_aggregate_matches_carts(self):
+        self.assertEqual(calculate_shopping_lists(), self.expected)
+        self.assertEqual(get_stored_shopping_lists(), self.expected)
+
+    def test_calculate_for_users(self):
+        user_ids = [self.buyers[0].id, self.buyers[-1].id]
+        self.assertEqual(calculate_shopping_lists(user_ids), {
+            key: amount for key, amount in self.expected.items()
+            if key[0] in user_ids
+        })
+
+    def test_rebuild_for_users(self):
+        user_ids = [buyer.id for buyer in self.buyers[:2]]
+        ShoppingListIngredients.objects.filter(user__id__in=user_ids).update(
+            amount=1)
+        call_command(
+            'rebuild_shopping_lists', user_ids=user_ids, stdout=io.StringIO())
+        call_command(
+            'rebuild_shopping_lists', verify=True, user_ids=user_ids,
+            stdout=io.StringIO())
+        self.assertEqual(get_stored_shopping_lists(), self.expected)
+
+    def test_change_adds_to_existing_and_missing_rows(self):
+        buyer = self.buyers[0]
+        first, second = self.ingredients[:2]
+        ShoppingListIngredients.objects.filter(
+            user=buyer, ingredient=second).delete()
+        ShoppingListIngredients.objects.create(
+            user=buyer, ingredient=second, amount=5)
+        change_shopping_lists([buyer.id], {first.id: 1, second.id: 2})
+        stored = get_stored_shopping_lists([buyer.id])
+        self.assertEqual(stored[(buyer.id, first.id)], 31)
+        self.assertEqual(stored[(buyer.id, second.id)], 7)
+
+    def test_emptied_rows_are_hidden(self):
+        client = APIClient()
+        client.force_authenticate(self.buyers[-1])
+        for recipe in self.recipes[1:3]:
+            client.delete(f'/api/recipes/{recipe.id}/shopping_cart/')
+        client.post(f'/api/recipes/{self.recipes[3].id}/shopping_cart/')
+        client.delete(f'/api/recipes/{self.recipes[3].id}/shopping_cart/')
+        user_ids = [self.buyers[-1].id]
+        self.assertTrue(ShoppingListIngredients.objects.filter(
+            user__id__in=user_ids, amount=0).exists())
+        self.assertEqual(get_stored_shopping_lists(user_ids), {})
+        call_command(
+            'rebuild_shopping_lists', user_ids=user_ids, stdout=io.StringIO())
+        self.assertFalse(ShoppingListIngredients.objects.filter(
+            user__id__in=user_ids).exists())
+
+
+class ShoppingListSignalsTests(APITestCase):
+    """Списки покупок верны после правок в обход API:
+    в админке, каскадом и из shell."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tags, cls.ingredients = create_catalogue(ingredients=3)
+        cls.buyers = create_users(2, prefix='buyer')
+        cls.authors = create_users(2, prefix='author')
+        cls.recipes = create_recipes(cls.authors, cls.tags, cls.ingredients)
+
+    def setUp(self):
+        super().setUp()
+        for buyer in self.buyers:
+            client = APIClient()
+            client.force_authenticate(buyer)
+            for recipe in self.recipes:
+                client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_author_deleted(self):
+        self.authors[0].delete()
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_recipe_deleted(self):
+        self.recipes[0].delete()
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_ingredient_deleted(self):
+        Ingredient.objects.filter(id=self.ingredients[0].id).delete()
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_buyer_deleted(self):
+        self.buyers[0].delete()
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_recipe_ingredients_edited(self):
+        recipe = self.recipes[0]
+        item = AmountIngredients.objects.get(
+            recipe=recipe, ingredients=self.ingredients[0])
+        item.amount = 25
+        item.save()
+        item = AmountIngredients.objects.get(
+            recipe=recipe, ingredients=self.ingredients[1])
+        item.ingredients = self.ingredients[2]
+        item.save()
+        AmountIngredients.objects.filter(
+            recipe=recipe, ingredients=self.ingredients[2]).first().delete()
+        AmountIngredients.objects.create(
+            recipe=recipe, ingredients=self.ingredients[1], amount=5)
+        self.assertEqual(verify_shopping_lists(), [])
+
+    def test_cart_edited(self):
+        item = BuyLists.objects.filter(user=self.buyers[0]).first()
+        item.user = self.buyers[1]
+        item.recipe = self.recipes[-1]
+        BuyLists.objects.filter(
+            user=self.buyers[1], recipe=self.recipes[-1]).delete()
+        item.save()
+        BuyLists.objects.filter(user=self.buyers[1]).first().delete()
+        self.assertEqual(verify_shopping_lists(), [])
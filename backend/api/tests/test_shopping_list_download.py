@@ -0,0 +1,78 @@
+"""Ошибки выгрузки списка покупок отдаются как JSON"""
+
+from api.throttling import CONCURRENCY_KEY
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_catalogue, create_recipes, create_users
+
+URL = '/api/recipes/download_shopping_cart/'
+
+
+class ShoppingListDownloadTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tags, ingredients = create_catalogue(ingredients=3)
+        cls.buyer, author = create_users(2)
+        cls.recipe, = create_recipes([author], tags, ingredients)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.buyer)
+
+    def add_to_cart(self):
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertEqual(response.status_code, 201)
+
+    def assert_json_error(self, response, status_code):
+        self.assertEqual(response.status_code, status_code)
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+    def test_file_formats(self):
+        self.add_to_cart()
+        for file_format, content_type in (
+            ('pdf', 'application/pdf'),
+            ('txt', 'text/plain; charset=utf-8'),
+            ('csv', 'text/csv; charset=utf-8'),
+            ('json', 'application/json; charset=utf-8'),
+        ):
+            with self.subTest(format=file_format):
+                response = self.client.get(URL, {'format': file_format})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['Content-Type'], content_type)
+                b''.join(response.streaming_content)
+
+    def test_anonymous(self):
+        for file_format in ('pdf', 'txt', 'csv'):
+            with self.subTest(format=file_format):
+                response = APIClient().get(URL, {'format': file_format})
+                self.assert_json_error(response, 401)
+                self.assertIn('detail', response.json())
+
+    def test_empty_cart(self):
+        response = self.client.get(URL, HTTP_ACCEPT='application/pdf')
+        self.assertEqual(response.status_code, 400)
+        # Тело пустое, и заголовок DRF не ставит вовсе
+        self.assertNotIn('pdf', response.get('Content-Type', ''))
+
+    def test_unknown_format(self):
+        self.assert_json_error(self.client.get(URL, {'format': 'xml'}), 404)
+
+    @override_settings(THROTTLE_RATES={'shopping_list': '1/min'})
+    def test_throttled(self):
+        self.add_to_cart()
+        response = self.client.get(URL, {'format': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        b''.join(response.streaming_content)
+        self.assert_json_error(self.client.get(URL, {'format': 'pdf'}), 429)
+
+    @override_settings(CONCURRENCY_LIMITS={'shopping_list': 1})
+    def test_overloaded(self):
+        self.add_to_cart()
+        # Место уже занято другим запросом
+        cache.set(CONCURRENCY_KEY.format(scope='shopping_list'), 1, 60)
+        self.assert_json_error(self.client.get(URL, {'format': 'pdf'}), 503)
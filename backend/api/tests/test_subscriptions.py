@@ -0,0 +1,88 @@
+"""Подписки на авторов и список подписок с recipes_limit"""
+
+from rest_framework.test import APIClient
+from users.models import Subscriptions
+
+from .base import APITestCase, create_catalogue, create_recipes, create_users
+
+
+class SubscriptionsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        tags, ingredients = create_catalogue()
+        cls.user, cls.lonely = create_users(2, prefix='viewer')
+        cls.authors = create_users(2, prefix='author')
+        for _ in range(3):
+            create_recipes(cls.authors, tags, ingredients[:1])
+        Subscriptions.objects.bulk_create(
+            Subscriptions(user=cls.user, author=author)
+            for author in cls.authors
+        )
+
+    def get(self, user, path):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(path)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def test_without_subscriptions(self):
+        for path in (
+            '/api/users/subscriptions/',
+            '/api/users/subscriptions/?recipes_limit=2',
+            '/api/users/subscriptions/?cursor=',
+            '/api/users/subscriptions/?cursor=&recipes_limit=2',
+        ):
+            with self.subTest(path=path):
+                self.assertEqual(self.get(self.lonely, path)['results'], [])
+
+    def test_recipes_limit(self):
+        data = self.get(
+            self.user, '/api/users/subscriptions/?recipes_limit=2')
+        self.assertEqual(len(data['results']), len(self.authors))
+        for author in data['results']:
+            self.assertEqual(len(author['recipes']), 2)
+            self.assertEqual(author['recipes_count'], 3)
+
+    def test_invalid_recipes_limit(self):
+        for limit in ('²', 'abc', '0', '-1'):
+            with self.subTest(limit=limit):
+                data = self.get(
+                    self.user,
+                    f'/api/users/subscriptions/?recipes_limit={limit}')
+                for author in data['results']:
+                    self.assertEqual(len(author['recipes']), 3)
+
+
+class SubscribeTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_users(2)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def subscribe(self, author_id):
+        return self.client.post(f'/api/users/{author_id}/subscribe/')
+
+    def test_subscribe_twice(self):
+        self.assertEqual(self.subscribe(self.author.id).status_code, 201)
+        self.assertEqual(self.subscribe(self.author.id).status_code, 400)
+        self.assertEqual(Subscriptions.objects.filter(
+            user=self.user, author=self.author).count(), 1)
+
+    def test_subscribe_to_self(self):
+        self.assertEqual(self.subscribe(self.user.id).status_code, 400)
+        self.assertFalse(Subscriptions.objects.exists())
+
+    def test_missing_author(self):
+        for author_id in (self.author.id + 100, '²', 'abc'):
+            with self.subTest(author_id=author_id):
+                self.assertEqual(self.subscribe(author_id).status_code, 404)
+                response = self.client.delete(
+                    f'/api/users/{author_id}/subscribe/')
+                self.assertEqual(response.status_code, 404)
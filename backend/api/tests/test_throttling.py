@@ -0,0 +1,33 @@
+"""Отдельный лимит для дальних страниц ленты"""
+
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from .base import APITestCase, create_users
+
+
+@override_settings(THROTTLE_RATES={'deep_feed': '1/min'}, THROTTLE_DEEP_PAGE=2)
+class DeepFeedThrottleTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, = create_users(1)
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_page(self, page):
+        return self.client.get(f'/api/recipes/?page={page}').status_code
+
+    def test_deep_pages_are_throttled(self):
+        # Рецептов нет, поэтому любая страница кроме первой - 404
+        self.assertEqual(self.get_page(3), 404)
+        self.assertEqual(self.get_page(4), 429)
+        self.assertEqual(self.get_page(2), 404)
+
+    def test_not_decimal_page(self):
+        for page in ('²', '٣x', '-3', ''):
+            with self.subTest(page=page):
+                self.assertIn(self.get_page(page), (200, 404))
@@ -0,0 +1,197 @@
+"""Ограничение частоты и числа одновременных дорогих запросов.
+
+Частота - token bucket на пользователя (для анонимов - на IP) и
+область (scope): в памяти процесса, при THROTTLE_SHARED_CACHE - в
+общем кэше Django. Превышение - 429 с Retry-After.
+
+Число одновременных запросов области считается в кэше Django, общем
+для всех воркеров при memcached/redis. Сверх CONCURRENCY_LIMITS
+запрос сразу получает 503, не занимая воркер.
+
+Область задаётся в @action(throttle_scope=...) или в throttle_scopes
+вьюсета для стандартных действий, лимиты - в настройках по области.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import exceptions, status
+from rest_framework.throttling import BaseThrottle
+
+BUCKET_KEY = 'throttle:{scope}:{ident}'
+CONCURRENCY_KEY = 'concurrency:{scope}'
+PERIODS = {'s': 1, 'm': 60, 'h': 60 * 60, 'd': 24 * 60 * 60}
+# Сколько вызовов между чистками полных корзин в памяти процесса
+PRUNE_INTERVAL = 1000
+
+
+def parse_rate(rate):
+    """'10/min' -> (10, 60). Пустая строка или None - без ограничения."""
+    if not rate:
+        return None
+    count, period = rate.split('/')
+    return int(count), PERIODS[period[0]]
+
+
+def take_token(state, capacity, period, now):
+    """Забирает токен из корзины state = (токены, время).
+
+    Возвращает новое состояние и сколько секунд ждать, 0 - токен взят.
+    """
+    tokens, updated = state or (capacity, now)
+    tokens = min(capacity, tokens + (now - updated) * capacity / period)
+    if tokens >= 1:
+        return (tokens - 1, now), 0
+    return (tokens, now), (1 - tokens) * period / capacity
+
+
+class LocalBuckets:
+    """Корзины в памяти процесса: {ключ: ((токены, время), период)}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.calls = 0
+
+    def take(self, key, capacity, period):
+        now = time.monotonic()
+        with self.lock:
+            state, _ = self.buckets.get(key, (None, period))
+            state, wait = take_token(state, capacity, period, now)
+            self.buckets[key] = state, period
+            self.calls += 1
+            if self.calls % PRUNE_INTERVAL == 0:
+                self.prune(now)
+        return wait
+
+    def prune(self, now):
+        # Корзина, простоявшая свой период, снова полная и не нужна
+        self.buckets = {
+            key: (state, period)
+            for key, (state, period) in self.buckets.items()
+            if now - state[1] < period
+        }
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+class SharedBuckets:
+    """Корзины в общем кэше. Чтение и запись не атомарны, при гонке
+    несколько лишних запросов могут пройти - для защиты от перегрузки
+    этого достаточно."""
+
+    def take(self, key, capacity, period):
+        now = time.time()
+        state, wait = take_token(cache.get(key), capacity, period, now)
+        cache.set(key, state, period)
+        return wait
+
+
+local_buckets = LocalBuckets()
+shared_buckets = SharedBuckets()
+
+
+def get_throttle_scope(view):
+    get_scope = getattr(view, 'get_throttle_scope', None)
+    if get_scope is not None:
+        return get_scope()
+    return getattr(view, 'throttle_scope', None)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Token bucket по THROTTLE_RATES[область]: ёмкость - число
+    запросов, за период корзина наполняется полностью."""
+
+    def allow_request(self, request, view):
+        scope = get_throttle_scope(view)
+        rate = parse_rate(settings.THROTTLE_RATES.get(scope))
+        if rate is None:
+            return True
+        user = request.user
+        ident = (
+            f'user:{user.pk}' if user.is_authenticated
+            else f'ip:{self.get_ident(request)}'
+        )
+        key = BUCKET_KEY.format(scope=scope, ident=ident)
+        buckets = (
+            shared_buckets if settings.THROTTLE_SHARED_CACHE
+            else local_buckets
+        )
+        self.retry_after = buckets.take(key, *rate)
+        return not self.retry_after
+
+    def wait(self):
+        return self.retry_after
+
+
+class Overloaded(exceptions.APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервер перегружен, повторите запрос позже.'
+    default_code = 'overloaded'
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+def acquire_slot(scope):
+    """Занимает место среди одновременных запросов области.
+
+    Ключ живёт CONCURRENCY_TIMEOUT секунд, чтобы места упавших
+    процессов не терялись навсегда.
+    """
+    limit = settings.CONCURRENCY_LIMITS.get(scope)
+    if not limit:
+        return None
+    key = CONCURRENCY_KEY.format(scope=scope)
+    cache.add(key, 0, settings.CONCURRENCY_TIMEOUT)
+    try:
+        in_flight = cache.incr(key)
+    except ValueError:
+        # Ключ истёк между add и incr
+        cache.add(key, 1, settings.CONCURRENCY_TIMEOUT)
+        in_flight = 1
+    if in_flight > limit:
+        release_slot(key)
+        raise Overloaded(wait=1)
+    return key
+
+
+def release_slot(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        pass
+
+
+class ThrottledViewMixin:
+    """Подключает TokenBucketThrottle и лимит одновременных запросов
+    к вьюсету. Место освобождается по выходу из dispatch, в том числе
+    при необработанном исключении; выдача потокового ответа клиенту
+    в лимит не входит."""
+
+    throttle_classes = (TokenBucketThrottle, )
+    # Задаётся в @action(throttle_scope=...)
+    throttle_scope = None
+    # Области стандартных действий: {'create': 'recipe_write'}
+    throttle_scopes = {}
+    concurrency_key = None
+
+    def get_throttle_scope(self):
+        return self.throttle_scopes.get(self.action, self.throttle_scope)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.concurrency_key = acquire_slot(self.get_throttle_scope())
+
+    def dispatch(self, request, *args, **kwargs):
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self.concurrency_key is not None:
+                release_slot(self.concurrency_key)
+                self.concurrency_key = None
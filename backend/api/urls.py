@@ -1,5 +1,8 @@
+from api.metrics import metrics
+from api.profiling import ProfileView
 from api.views import (IngredientViewSet, MyUserViewSet, RecipeViewSet,
                        TagViewSet)
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -13,7 +16,17 @@ router.register(r'recipes', RecipeViewSet)
 router.register(r'users', MyUserViewSet)
 
 urlpatterns = [
+    path('metrics/', metrics, name='metrics'),
+    path(
+        'profiles/<str:profile_id>/',
+        ProfileView.as_view(),
+        name='profile',
+    ),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_READS:
+    # Под ASGI чтение идёт через асинхронные вьюхи, остальное - как было
+    urlpatterns.insert(0, path('', include('api.async_urls')))
@@ -1,15 +1,11 @@
-import io
-
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
-from recipes.models import (AmountIngredients, BuyLists, Favourites,
-                            Ingredient, Recipe, Tag)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen import canvas
+from recipes.models import BuyLists, Favourites, Ingredient, Recipe, Tag
 from rest_framework import filters, status, viewsets
 from rest_framework.decorators import action
 from rest_framework.pagination import PageNumberPagination
@@ -18,12 +14,23 @@ from rest_framework.permissions import (AllowAny, IsAuthenticated,
 from rest_framework.response import Response
 from users.models import MyUser, Subscriptions
 
+from .cache import (get_cached_feed, get_feed_cache_key,
+                    invalidate_subscriptions, set_cached_feed)
 from .filters import IngredientFilter, RecipeFilter
+from .pagination import KeysetPagination, SubscriptionsPagination
 from .permissions import IsAuthorOrReadOnly
+from .prefetch import RECIPE_SELECT_RELATED
+from .renderers import SHOPPING_LIST_RENDERERS
+from .search import search_ingredients
 from .serializers import (CreateRecipeSerializer, IngredientSerializer,
                           ReadRecipeSerializer, TagSerializer, UserSerializer,
                           UserSubscriptionsSerializer)
-from .services import ActionMethods
+from .services import (ActionMethods, delete_rows, get_recipes_limit,
+                       insert_if_absent, prefetch_subscription_recipes,
+                       with_subscription_relations)
+from .shopping_list import (change_shopping_lists, get_cart_user_ids,
+                            get_recipe_amounts, negate, shopping_list_response)
+from .throttling import ThrottledViewMixin
 
 
 class MyUserViewSet(UserViewSet):
@@ -37,12 +44,16 @@ class MyUserViewSet(UserViewSet):
         methods=['GET'],
         detail=False,
         url_path='subscriptions',
-        permission_classes=(IsAuthenticated, )
+        permission_classes=(IsAuthenticated, ),
+        pagination_class=SubscriptionsPagination,
     )
     def subscriptions(self, request):
         user = self.request.user
-        queryset = Subscriptions.objects.filter(user=user)
+        queryset = with_subscription_relations(
+            Subscriptions.objects.filter(user=user)
+        ).order_by('-subscription_date')
         page = self.paginate_queryset(queryset)
+        prefetch_subscription_recipes(page, get_recipes_limit(request))
         serializer = UserSubscriptionsSerializer(
             page, many=True, context={'request': request}
         )
@@ -55,34 +66,44 @@ class MyUserViewSet(UserViewSet):
     )
     def subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(MyUser, id=id)
-        subscribe = Subscriptions.objects.filter(user=user, author=author)
+        # id из URL - строка, '07' и '7' - один и тот же автор
+        if not id.isdecimal():
+            raise Http404
+        author_id = int(id)
+        authors = MyUser.objects.filter(id=author_id)
         if request.method == 'POST':
-            if user == author:
+            if user.id == author_id:
                 return Response({
                     'errors': 'Вы не можете подписываться на самого себя'
                 }, status=status.HTTP_400_BAD_REQUEST)
-            if subscribe.exists():
+            if not insert_if_absent(
+                    Subscriptions, authors, user=user, author_id=author_id):
+                get_object_or_404(authors)
                 return Response({
                     'errors': 'Вы уже подписаны на данного пользователя'
                 }, status=status.HTTP_400_BAD_REQUEST)
-
+            invalidate_subscriptions(user.id)
+            subscription = with_subscription_relations(
+                Subscriptions.objects.filter(user=user, author_id=author_id)
+            ).get()
+            prefetch_subscription_recipes(
+                [subscription], get_recipes_limit(request)
+            )
             serializer = UserSubscriptionsSerializer(
-                Subscriptions.objects.create(
-                    user=request.user,
-                    author=author
-                ),
+                subscription,
                 context={'request': request},
             )
             return Response(
                 serializer.data, status=status.HTTP_201_CREATED
             )
 
-        if not subscribe.exists():
+        if not delete_rows(
+                Subscriptions.objects.filter(user=user, author_id=author_id)):
+            get_object_or_404(authors)
             return Response({
                 'errors': 'Вы не подписаны на данного пользователя'
             }, status=status.HTTP_400_BAD_REQUEST)
-        subscribe.delete()
+        invalidate_subscriptions(user.id)
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -99,18 +120,88 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend, filters.SearchFilter,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+        serializer = self.get_serializer(search_ingredients(name), many=True)
+        return Response(serializer.data)
+
 
-class RecipeViewSet(viewsets.ModelViewSet, ActionMethods):
+class RecipeViewSet(ThrottledViewMixin, viewsets.ModelViewSet, ActionMethods):
     queryset = Recipe.objects.all()
     serializer_class = CreateRecipeSerializer
     permission_classes = (IsAuthorOrReadOnly, IsAuthenticatedOrReadOnly)
-    pagination_class = PageNumberPagination
+    pagination_class = KeysetPagination
     filter_backends = (DjangoFilterBackend, )
     filterset_class = RecipeFilter
+    # Запись декодирует картинку из base64
+    throttle_scopes = {
+        'create': 'recipe_write',
+        'update': 'recipe_write',
+        'partial_update': 'recipe_write',
+    }
+
+    def get_throttle_scope(self):
+        """Дальние страницы с OFFSET дороже курсорных."""
+        page = self.request.query_params.get(
+            self.paginator.page_query_param, '')
+        if (self.action == 'list' and page.isdecimal()
+                and int(page) > settings.THROTTLE_DEEP_PAGE):
+            return 'deep_feed'
+        return super().get_throttle_scope()
+
+    def get_queryset(self):
+        user = self.request.user
+        # Остальные связи подгружаются только для рецептов,
+        # которых нет в кэше фрагментов
+        queryset = Recipe.objects.select_related(*RECIPE_SELECT_RELATED)
+        if user.is_anonymous:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(Favourites.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+            is_in_shopping_cart=Exists(BuyLists.objects.filter(
+                user=user, recipe=OuterRef('pk'))),
+        )
+
+    def get_anonymous_response(self, view, request, *args, **kwargs):
+        """Ответы анонимам не зависят от пользователя и берутся из кэша,
+        пока рецепты, теги и авторы не менялись."""
+        if not request.user.is_anonymous:
+            return view(request, *args, **kwargs)
+        key = get_feed_cache_key(request)
+        data = get_cached_feed(key)
+        if data is not None:
+            return Response(data)
+        response = view(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_cached_feed(key, response.data)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_anonymous_response(
+            super().retrieve, request, *args, **kwargs)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Все корзины с рецептом вычитаются одним UPDATE, а строки корзин
+        # удаляются без сигналов, иначе каскад вычитал бы рецепт
+        # из каждой корзины отдельно
+        change_shopping_lists(
+            get_cart_user_ids(instance.id),
+            negate(get_recipe_amounts(instance.id))
+        )
+        delete_rows(BuyLists.objects.filter(recipe=instance))
+        instance.delete()
+
     def get_serializer_class(self):
         if self.request.method in ('POST', 'PATCH'):
             return CreateRecipeSerializer
@@ -141,45 +232,16 @@ class RecipeViewSet(viewsets.ModelViewSet, ActionMethods):
     @action(
         methods=['GET'],
         detail=False,
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        throttle_scope='shopping_list',
     )
     def download_shopping_cart(self, request):
         user = self.request.user
         if not user.buylists.exists():
             return Response(status=status.HTTP_400_BAD_REQUEST)
-        ingredients = AmountIngredients.objects.filter(
-            recipe__in_buylist__user=request.user).values(
-                'ingredients__name',
-                'ingredients__measurement_unit'
-            ).annotate(
-                ingredient_amount=Sum('amount')
-        ).order_by('ingredients__name')
-
-        pdfmetrics.registerFont(
-            TTFont(
-                'droid-serif',
-                'fonts/droid-serif.ttf'
-            )
-        )
-        buffer = io.BytesIO()
-        pdf_file = canvas.Canvas(buffer)
-        pdf_file.setFont('droid-serif', 24)
-        pdf_file.drawString(200, 800, 'Список покупок')
-        pdf_file.setFont('droid-serif', 14)
-        height = 750
-        width = 75
-        for i, item in enumerate(ingredients, 1):
-            pdf_file.drawString(width, height, (
-                f'{i}. {item["ingredients__name"]} '
-                f'- {item["ingredient_amount"]} '
-                f'{item["ingredients__measurement_unit"]}')
-            )
-            height -= 25
-        pdf_file.showPage()
-        pdf_file.save()
-        buffer.seek(0)
-        return FileResponse(
-            buffer,
-            as_attachment=True,
-            filename="shopping_list.pdf"
+        return shopping_list_response(
+            user,
+            request.accepted_renderer.format,
+            request.accepted_renderer.media_type,
         )
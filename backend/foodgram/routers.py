@@ -0,0 +1,102 @@
+"""Чтение с реплики БД с привязкой к основной базе после записи"""
+
+import asyncio
+import hashlib
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+
+PRIMARY = 'default'
+REPLICA = 'replica'
+# Без задержки репликации: токен нужен сразу после входа
+PRIMARY_ONLY_MODELS = {'authtoken.token', 'sessions.session'}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+STICKY_CACHE_KEY = 'replica_sticky:{digest}'
+
+use_replica = ContextVar('use_replica', default=False)
+
+
+class ReplicaRouter:
+    """Читает с реплики только внутри безопасных HTTP-запросов,
+    разрешённых ReplicaMiddleware. Команды, фоновые задачи и всё,
+    что идёт вне запроса, работают с основной базой."""
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if model._meta.label_lower in PRIMARY_ONLY_MODELS:
+            return PRIMARY
+        return REPLICA if use_replica.get() else PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+def get_cache_timeout(timeout):
+    """Срок для записи в кэш из данных запроса.
+
+    Данные, прочитанные с реплики, могут отставать от уже сброшенного
+    кэша, поэтому такие записи живут не дольше REPLICA_CACHE_TIMEOUT.
+    """
+    if not use_replica.get():
+        return timeout
+    if timeout is None:
+        return settings.REPLICA_CACHE_TIMEOUT
+    return min(timeout, settings.REPLICA_CACHE_TIMEOUT)
+
+
+def get_client_key(request):
+    """Клиент определяется по токену или сессии, до аутентификации."""
+    credentials = request.META.get('HTTP_AUTHORIZATION') or (
+        request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+    if not credentials:
+        return None
+    return STICKY_CACHE_KEY.format(
+        digest=hashlib.sha256(credentials.encode()).hexdigest())
+
+
+class ReplicaMiddleware(MiddlewareMixin):
+    """После записи клиент REPLICA_STICKY_SECONDS читает с основной
+    базы, чтобы видеть свои изменения в избранном и корзине."""
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.acall(request)
+        token = use_replica.set(self.can_use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.stick(request, response)
+        return response
+
+    async def acall(self, request):
+        token = use_replica.set(self.can_use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            use_replica.reset(token)
+        self.stick(request, response)
+        return response
+
+    def can_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        key = get_client_key(request)
+        return key is None or cache.get(key) is None
+
+    def stick(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return
+        key = get_client_key(request)
+        if key is not None:
+            cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
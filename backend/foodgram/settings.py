@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -53,11 +54,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -97,6 +100,51 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения: включается, если задан DB_REPLICA_HOST или
+# DB_REPLICA_NAME. После записи клиент читает с основной базы
+# ещё REPLICA_STICKY_SECONDS, для нескольких процессов нужен общий кэш
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', default=10))
+# Сколько живут фрагменты и ответы ленты, собранные из данных реплики
+REPLICA_CACHE_TIMEOUT = int(os.getenv('REPLICA_CACHE_TIMEOUT', default=10))
+
+if os.getenv('DB_REPLICA_HOST') or os.getenv('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.getenv('DB_REPLICA_NAME', default=DATABASES['default']['NAME']),
+        'HOST': os.getenv('DB_REPLICA_HOST', default=DATABASES['default']['HOST']),
+        'PORT': os.getenv('DB_REPLICA_PORT', default=DATABASES['default']['PORT']),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_ROUTERS = ['foodgram.routers.ReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('api.profiling.ProfilingMiddleware'),
+        'foodgram.routers.ReplicaMiddleware',
+    )
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', default='foodgram'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', default=10000)),
+        },
+    }
+}
+
+# Сброс кэша по сигналу виден другим воркерам только при общем
+# CACHE_BACKEND (memcached, redis). С кэшем в памяти процесса такие
+# записи живут не дольше LOCAL_CACHE_TIMEOUT секунд
+LOCAL_CACHE_TIMEOUT = int(os.getenv('LOCAL_CACHE_TIMEOUT', default=60))
+
+# Сколько секунд живут закэшированные ответы ленты рецептов для анонимов
+RECIPE_FEED_CACHE_TIMEOUT = int(os.getenv('RECIPE_FEED_CACHE_TIMEOUT', default=5 * 60))
+
+# Сколько секунд живут закэшированные фрагменты рецептов без данных
+# пользователя
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', default=60 * 60))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', default=50))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -140,6 +188,23 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', default=10 * 1024 * 1024))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', default=2))
+
+# Метрики Prometheus: каталог общий для всех процессов gunicorn,
+# без METRICS_TOKEN эндпоинт /api/metrics/ отдаёт 404
+METRICS_DIR = os.getenv('METRICS_DIR', default=os.path.join(tempfile.gettempdir(), 'foodgram-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('METRICS_FLUSH_INTERVAL', default=5))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', default='')
+
+# Асинхронные вьюхи для чтения тегов, ингредиентов и рецептов,
+# включается в foodgram/asgi.py
+ASYNC_READS = os.getenv('ASYNC_READS', default='') == '1'
+
+# Сколько секунд хранятся отчёты профилировщика (X-Profile: 1 от staff)
+PROFILE_TTL = int(os.getenv('PROFILE_TTL', default=60 * 60))
 
 
 REST_FRAMEWORK = {
@@ -147,7 +212,7 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
@@ -159,6 +224,32 @@ REST_FRAMEWORK = {
     'UPLOADED_FILES_USE_URL': False,
 }
 
+# Кэш токенов: LRU процесса, при AUTH_TOKEN_SHARED_CACHE=1 ещё и общий
+# кэш Django. Отозванный токен в других процессах живёт не дольше TTL
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', default=10000))
+AUTH_TOKEN_CACHE_TTL = int(os.getenv('AUTH_TOKEN_CACHE_TTL', default=30))
+AUTH_TOKEN_SHARED_CACHE = os.getenv('AUTH_TOKEN_SHARED_CACHE', default='') == '1'
+AUTH_TOKEN_SHARED_CACHE_TTL = int(os.getenv('AUTH_TOKEN_SHARED_CACHE_TTL', default=5 * 60))
+
+# Ограничения дорогих запросов по областям (api/throttling.py):
+# частота на пользователя в виде 'N/min' (пустая строка - без
+# ограничения) и число одновременных запросов на все воркеры при общем
+# кэше (0 - без ограничения)
+THROTTLE_RATES = {
+    'shopping_list': os.getenv('THROTTLE_SHOPPING_LIST', default='10/min'),
+    'recipe_write': os.getenv('THROTTLE_RECIPE_WRITE', default='30/min'),
+    'deep_feed': os.getenv('THROTTLE_DEEP_FEED', default='60/min'),
+}
+THROTTLE_SHARED_CACHE = os.getenv('THROTTLE_SHARED_CACHE', default='') == '1'
+# С какой страницы (page=) лента считается дальней
+THROTTLE_DEEP_PAGE = int(os.getenv('THROTTLE_DEEP_PAGE', default=20))
+CONCURRENCY_LIMITS = {
+    'shopping_list': int(os.getenv('CONCURRENCY_SHOPPING_LIST', default=4)),
+    'recipe_write': int(os.getenv('CONCURRENCY_RECIPE_WRITE', default=8)),
+    'deep_feed': int(os.getenv('CONCURRENCY_DEEP_FEED', default=8)),
+}
+CONCURRENCY_TIMEOUT = int(os.getenv('CONCURRENCY_TIMEOUT', default=60))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'HIDE_USERS': False,
@@ -0,0 +1,40 @@
+"""Файловое хранилище с адресацией по содержимому"""
+
+import hashlib
+import os
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Сохраняет файл под именем <каталог>/<ab>/<sha256>.<расширение>.
+
+    Одинаковые загрузки хранятся один раз, а содержимое файла по
+    выданному адресу никогда не меняется, поэтому его можно кэшировать
+    навсегда (Cache-Control: immutable).
+    """
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Свежая дата защищает файл от collect_media_garbage
+            # --min-age, пока ссылка на него не закоммичена
+            os.utime(self.path(name))
+            return name
+        return super().save(name, content, max_length)
+
+    def get_hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        dirname = os.path.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return os.path.join(dirname, digest[:2], digest + ext)
@@ -0,0 +1,17 @@
+"""Настройки gunicorn, файл читается из рабочего каталога"""
+
+import os
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+
+
+def on_starting(server):
+    from api.metrics import retire_workers
+    retire_workers()
+
+
+def child_exit(server, worker):
+    # Мастер вызывает хук до запуска замены, поэтому новый воркер
+    # с тем же pid не перезапишет снимок
+    from api.metrics import retire_workers
+    retire_workers([worker.pid])
@@ -3,7 +3,7 @@ from import_export import resources
 from import_export.admin import ImportExportModelAdmin
 
 from .models import (AmountIngredients, BuyLists, Favourites, Ingredient,
-                     Recipe, Tag)
+                     Recipe, ShoppingListIngredients, Tag)
 
 EMPTY_VALUE = 'Значение не указано'
 
@@ -58,9 +58,15 @@ class BuyListsAdmin(admin.ModelAdmin):
     search_fields = ('user', 'recipe')
 
 
+class ShoppingListIngredientsAdmin(admin.ModelAdmin):
+    list_display = ('user', 'ingredient', 'amount')
+    search_fields = ('user__username', 'ingredient__name')
+
+
 admin.site.register(Tag, TagAdmin)
 admin.site.register(Ingredient, IngredientAdmin)
 admin.site.register(Recipe, RecipeAdmin)
 admin.site.register(AmountIngredients)
 admin.site.register(Favourites, FavouritesAdmin)
 admin.site.register(BuyLists, BuyListsAdmin)
+admin.site.register(ShoppingListIngredients, ShoppingListIngredientsAdmin)
@@ -0,0 +1,64 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:46
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import F, Sum
+
+
+def fill_shopping_lists(apps, schema_editor):
+    AmountIngredients = apps.get_model('recipes', 'AmountIngredients')
+    ShoppingListIngredients = apps.get_model(
+        'recipes', 'ShoppingListIngredients')
+    rows = AmountIngredients.objects.filter(
+        recipe__in_buylist__isnull=False
+    ).values(
+        user_id=F('recipe__in_buylist__user'),
+        ingredient_id=F('ingredients'),
+    ).annotate(total=Sum('amount')).order_by()
+    ShoppingListIngredients.objects.bulk_create(
+        (
+            ShoppingListIngredients(
+                user_id=row['user_id'],
+                ingredient_id=row['ingredient_id'],
+                amount=row['total'],
+            )
+            for row in rows.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='amountingredients',
+            name='amount',
+            field=models.PositiveSmallIntegerField(default=0, validators=[django.core.validators.MinValueValidator(1, message='Нужен хотя бы один ингредиент!'), django.core.validators.MaxValueValidator(10000, message='Слишком много!')], verbose_name='Количество ингредиентов'),
+        ),
+        migrations.CreateModel(
+            name='ShoppingListIngredients',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(default=0, verbose_name='Общее количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='in_shopping_lists', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Владелец списка покупок')),
+            ],
+            options={
+                'verbose_name': 'Ингредиент в списке покупок',
+                'verbose_name_plural': 'Ингредиенты в списке покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistingredients',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique shopping list ingredient'),
+        ),
+        migrations.RunPython(fill_shopping_lists, migrations.RunPython.noop),
+    ]
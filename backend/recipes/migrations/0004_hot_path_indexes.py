@@ -0,0 +1,33 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shopping_list_ingredients'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='amountingredients',
+            index=models.Index(fields=['recipe', 'ingredients'], name='amount_recipe_ingredient_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='buylists',
+            index=models.Index(fields=['user', '-add_date'], name='buylist_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='favourites',
+            index=models.Index(fields=['user', '-add_date'], name='favourite_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+    ]
@@ -74,6 +74,12 @@ class Recipe(models.Model):
         verbose_name='Иллюстрация',
         upload_to='recipe_images/',
     )
+    image_variants = models.JSONField(
+        verbose_name='Уменьшенные копии иллюстрации',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     ingredients = models.ManyToManyField(
         to=Ingredient,
         verbose_name='Ингредиенты блюда',
@@ -108,6 +114,12 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date', )
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'],
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=['author', '-pub_date'],
+                         name='recipe_author_pub_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}. Автор: {self.author.username}'
@@ -145,6 +157,10 @@ class AmountIngredients(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Количество ингридиентов'
         ordering = ('recipe', )
+        indexes = [
+            models.Index(fields=['recipe', 'ingredients'],
+                         name='amount_recipe_ingredient_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.amount} {self.ingredients}'
@@ -175,6 +191,10 @@ class Favourites(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique favorite recipe for user')
         ]
+        indexes = [
+            models.Index(fields=['user', '-add_date'],
+                         name='favourite_user_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
@@ -205,6 +225,40 @@ class BuyLists(models.Model):
             models.UniqueConstraint(fields=['user', 'recipe'],
                                     name='unique cart user')
         ]
+        indexes = [
+            models.Index(fields=['user', '-add_date'],
+                         name='buylist_user_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} -> {self.recipe}'
+
+
+class ShoppingListIngredients(models.Model):
+    user = models.ForeignKey(
+        to=User,
+        verbose_name='Владелец списка покупок',
+        related_name='shopping_list',
+        on_delete=models.CASCADE
+    )
+    ingredient = models.ForeignKey(
+        to=Ingredient,
+        verbose_name='Ингредиент',
+        related_name='in_shopping_lists',
+        on_delete=models.CASCADE
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Общее количество',
+        default=0
+    )
+
+    class Meta:
+        verbose_name = 'Ингредиент в списке покупок'
+        verbose_name_plural = 'Ингредиенты в списке покупок'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'ingredient'],
+                                    name='unique shopping list ingredient')
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} -> {self.amount} {self.ingredient}'
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.18 on 2026-10-18 18:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='subscriptions',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subscribe', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddIndex(
+            model_name='subscriptions',
+            index=models.Index(fields=['user', '-subscription_date'], name='subscription_user_date_idx'),
+        ),
+    ]
@@ -70,6 +70,10 @@ class Subscriptions(models.Model):
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='unique_following')
         ]
+        indexes = [
+            models.Index(fields=['user', '-subscription_date'],
+                         name='subscription_user_date_idx'),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user.username} -> {self.author.username}'